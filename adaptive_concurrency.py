@@ -0,0 +1,146 @@
+"""
+自适应并发模块 - 按主机的AIMD并发窗口
+"""
+import threading
+import time
+from collections import deque
+from config import (MAX_CONCURRENT_PER_HOST, HOST_CONCURRENCY_LIMITS, AIMD_MIN_WINDOW,
+                    AIMD_MAX_WINDOW, AIMD_INCREASE, AIMD_DECREASE,
+                    AIMD_LATENCY_TOLERANCE, AIMD_SAMPLE_SIZE, AIMD_BASELINE_DECAY)
+
+# 视为服务端过载的状态码
+CONGESTION_STATUS_CODES = (429, 503)
+
+
+def percentile(values, fraction):
+    """
+    计算分位数（最近秩法）
+
+    Args:
+        values: 数值序列
+        fraction: 分位，如 0.95
+
+    Returns:
+        float: 分位数，序列为空时返回 None
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class AIMDWindow:
+    """
+    单个主机的AIMD并发窗口
+
+    健康响应使窗口每轮增加 AIMD_INCREASE；遇到 429/503、超时或 p95
+    超过基线 AIMD_LATENCY_TOLERANCE 倍时窗口乘以 AIMD_DECREASE。
+    同一轮内（约一个p95时长）只收缩一次，避免一批并发失败把窗口压到底。
+    窗口已在最小值而延迟仍高于基线时，说明主机的延迟整体上升了而不是并发造成的拥塞，
+    基线按 AIMD_BASELINE_DECAY 向最近的 p95 靠拢，窗口随后可以恢复。
+    """
+
+    def __init__(self, initial, minimum=AIMD_MIN_WINDOW, maximum=AIMD_MAX_WINDOW):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = float(min(max(initial, minimum), maximum))
+        self.baseline_p95 = None
+        self.increases = 0
+        self.decreases = 0
+        self._latencies = deque(maxlen=AIMD_SAMPLE_SIZE)
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self):
+        """当前允许的并发数"""
+        return max(self.minimum, int(self.window))
+
+    def record(self, latency, status_code=None, timed_out=False):
+        """
+        记录一次请求结果并调整窗口
+
+        Args:
+            latency: 请求耗时（秒）
+            status_code: HTTP状态码，请求未完成时为 None
+            timed_out: 是否超时
+        """
+        now = time.monotonic()
+        if not timed_out:
+            self._latencies.append(latency)
+        p95 = percentile(self._latencies, 0.95)
+
+        latency_rising = (self.baseline_p95 is not None
+                          and len(self._latencies) >= self._latencies.maxlen // 2
+                          and p95 > self.baseline_p95 * AIMD_LATENCY_TOLERANCE)
+        congested = timed_out or status_code in CONGESTION_STATUS_CODES or latency_rising
+
+        if congested:
+            if latency_rising and self.window <= self.minimum:
+                self.baseline_p95 += AIMD_BASELINE_DECAY * (p95 - self.baseline_p95)
+            if now - self._last_decrease >= (p95 or latency):
+                self.window = max(self.minimum, self.window * AIMD_DECREASE)
+                self._last_decrease = now
+                self.decreases += 1
+            return
+
+        if status_code is not None and status_code < 500:
+            # 基线只随健康样本缓慢移动，避免被拥塞期的高延迟拖高
+            if p95 is not None:
+                self.baseline_p95 = p95 if self.baseline_p95 is None else (
+                    0.95 * self.baseline_p95 + 0.05 * p95)
+            self.window = min(self.maximum, self.window + AIMD_INCREASE / self.window)
+            self.increases += 1
+
+    def snapshot(self):
+        """导出窗口状态"""
+        p95 = percentile(self._latencies, 0.95)
+        return {
+            "window": round(self.window, 2),
+            "limit": self.limit,
+            "p95": round(p95, 4) if p95 is not None else None,
+            "baseline_p95": round(self.baseline_p95, 4) if self.baseline_p95 is not None else None,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
+
+
+class AdaptiveConcurrencyController:
+    """按主机管理AIMD窗口，初始窗口取自 HOST_CONCURRENCY_LIMITS / MAX_CONCURRENT_PER_HOST"""
+
+    def __init__(self, initial_limits=None, default_limit=MAX_CONCURRENT_PER_HOST):
+        self.initial_limits = HOST_CONCURRENCY_LIMITS if initial_limits is None else initial_limits
+        self.default_limit = default_limit
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _window(self, host):
+        window = self._windows.get(host)
+        if window is None:
+            window = self._windows[host] = AIMDWindow(
+                self.initial_limits.get(host, self.default_limit))
+        return window
+
+    def limit(self, host):
+        """获取主机当前允许的并发数"""
+        with self._lock:
+            return self._window(host).limit
+
+    def record(self, host, latency, status_code=None, timed_out=False):
+        """记录主机的一次请求结果"""
+        with self._lock:
+            self._window(host).record(latency, status_code, timed_out)
+
+    def snapshot(self):
+        """
+        导出所有主机的窗口状态
+
+        Returns:
+            dict: 主机 -> 窗口状态
+        """
+        with self._lock:
+            return {host: window.snapshot() for host, window in self._windows.items()}
+
+
+# 进程内共享的并发控制器
+concurrency_controller = AdaptiveConcurrencyController()
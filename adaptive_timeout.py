@@ -0,0 +1,139 @@
+"""
+自适应超时模块 - 根据每个端点观测到的响应时间分布计算其请求超时
+"""
+import json
+import threading
+from collections import deque
+from config import (TIMEOUT_P99_FACTOR, TIMEOUT_FLOOR, TIMEOUT_CEILING, TIMEOUT_MIN_SAMPLES,
+                    TIMEOUT_SAMPLE_SIZE, TIMEOUT_STATE_FILE)
+from adaptive_concurrency import percentile
+from utils import atomic_open
+
+
+class AdaptiveTimeouts:
+    """
+    按端点计算的请求超时
+
+    超时 = 最近 sample_size 次响应时间（到收到响应头为止）的 p99 × factor，
+    限制在 [floor, ceiling] 内；样本少于 min_samples 时使用 ceiling。
+    超时的请求以当时的超时值计入样本，下次超时随之放宽，不会因为只记录成功样本
+    而越收越紧。样本保存在 path 中，下次运行直接使用。
+
+    Args:
+        factor: p99 的倍数
+        floor: 最短超时（秒）
+        ceiling: 最长超时（秒），也是样本不足时的超时
+        min_samples: 开始按分布计算前需要的样本数
+        sample_size: 每个端点保留的样本数
+        path: 样本的保存路径，为 None 时不保存
+    """
+
+    def __init__(self, factor=TIMEOUT_P99_FACTOR, floor=TIMEOUT_FLOOR, ceiling=TIMEOUT_CEILING,
+                 min_samples=TIMEOUT_MIN_SAMPLES, sample_size=TIMEOUT_SAMPLE_SIZE, path=TIMEOUT_STATE_FILE):
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.sample_size = sample_size
+        self.path = path
+        self._samples = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _endpoint_samples(self, key):
+        if self._samples is None:
+            self._samples = self._load()
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.sample_size)
+        return samples
+
+    def _load(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {key: deque(values, maxlen=self.sample_size) for key, values in data.items()}
+
+    def timeout(self, key):
+        """
+        获取端点当前的超时
+
+        Args:
+            key: 端点名称
+
+        Returns:
+            float: 超时（秒）
+        """
+        with self._lock:
+            samples = self._endpoint_samples(key)
+            if len(samples) < self.min_samples:
+                return self.ceiling
+            return round(min(max(percentile(samples, 0.99) * self.factor, self.floor), self.ceiling), 2)
+
+    def latency_percentile(self, key, fraction):
+        """
+        获取端点最近响应时间的分位数
+
+        Returns:
+            float: 秒数，样本少于 min_samples 时为 None
+        """
+        with self._lock:
+            samples = self._endpoint_samples(key)
+            if len(samples) < self.min_samples:
+                return None
+            return percentile(samples, fraction)
+
+    def record(self, key, latency):
+        """记录一次响应时间（秒）"""
+        with self._lock:
+            self._endpoint_samples(key).append(round(latency, 4))
+            self._dirty = True
+
+    def record_timeout(self, key, timeout):
+        """记录一次超时，以超时值计入样本"""
+        self.record(key, timeout)
+
+    def snapshot(self):
+        """
+        导出各端点的当前超时
+
+        Returns:
+            dict: 端点 -> {"timeout", "p99", "samples"}
+        """
+        with self._lock:
+            keys = list(self._samples or {})
+        result = {}
+        for key in keys:
+            with self._lock:
+                samples = list(self._endpoint_samples(key))
+            result[key] = {
+                "timeout": self.timeout(key),
+                "p99": percentile(samples, 0.99),
+                "samples": len(samples)
+            }
+        return result
+
+    def save(self):
+        """有新样本时保存到 path"""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: list(values) for key, values in self._samples.items()}
+            self._dirty = False
+        try:
+            with atomic_open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+
+
+# 进程内共享的超时策略，供 APIClient 使用
+timeout_policy = AdaptiveTimeouts()
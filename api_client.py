@@ -2,26 +2,122 @@
 API客户端模块 - 处理HTTP请求和响应
 """
 import requests
-import time
 import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from datetime import datetime
-from config import BASE_HEADERS, REQUEST_DELAY_SECONDS, OUTPUT_DIR, Colors, ERROR_LOG_FILE
-from utils import sanitize_filename, ensure_directory_exists, format_response_size, log_error_to_json
+from config import (OUTPUT_DIR, Colors, STREAM_CHUNK_SIZE, STREAM_JSON_THRESHOLD, STREAM_ERROR_EXCERPT,
+                    HTTP_CACHE_ENABLED)
+from utils import (sanitize_filename, format_response_size, format_byte_size, get_host, atomic_open,
+                   endpoint_key)
+from rate_limiter import rate_limiter as shared_rate_limiter
+from adaptive_concurrency import concurrency_controller as shared_concurrency_controller
+from adaptive_timeout import timeout_policy as shared_timeout_policy
+from retry_policy import retry_policy as shared_retry_policy
+from circuit_breaker import circuit_breakers as shared_circuit_breakers, is_breaker_failure
+from http_pool import build_session, collect_connection_stats, dns_cache
+from http_cache import HTTPCache
+from error_journal import error_journal
+from request_tracing import trace_request, span, ttfb_span, record_span, format_timing, bind_trace
+
+# 已流式写入磁盘的响应体
+StreamedFile = namedtuple("StreamedFile", ["path", "size"])
+
+
+def _close_response(future):
+    """关闭未被采用的对冲响应"""
+    if future.exception() is None:
+        future.result().close()
+
+
+def get_output_path(endpoint_name, file_ext=".json"):
+    """
+    获取端点响应的保存路径
+    """
+    return f"{OUTPUT_DIR}/{sanitize_filename(endpoint_name)}{file_ext}"
 
 
 class APIClient:
     """API客户端类，负责发送请求和处理响应"""
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update(BASE_HEADERS)
+    def __init__(self, pool_sizes=None, rate_limiter=None, concurrency_controller=None,
+                 use_cache=HTTP_CACHE_ENABLED, timeouts=None, retry_policy=None,
+                 circuit_breakers=None):
+        self.session = build_session(pool_sizes)
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        self.concurrency_controller = concurrency_controller or shared_concurrency_controller
+        self.timeouts = timeouts or shared_timeout_policy
+        self.retry_policy = retry_policy or shared_retry_policy
+        self.circuit_breakers = circuit_breakers or shared_circuit_breakers
+        self._hedge_executor = None
+        # 主机 -> 已发出、尚未收到响应头的请求数，对冲请求据此判断主机的并发窗口是否还有余量
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.cache = HTTPCache() if use_cache else None
+        dns_cache.install()
+        self._closed = False
+
+    def close(self):
+        """关闭会话及其连接池，并保存各端点的超时样本"""
+        if not self._closed:
+            self._closed = True
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+            self.session.close()
+            dns_cache.uninstall()
+            try:
+                self.timeouts.save()
+            except OSError as e:
+                print(f"{Colors.WARNING}保存超时样本失败: {e}{Colors.ENDC}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connection_stats(self):
+        """
+        获取连接复用统计
+
+        Returns:
+            dict: 新建/复用连接数、按主机统计及DNS缓存命中情况
+        """
+        hosts = collect_connection_stats(self.session)
+        return {
+            "opened": sum(h["opened"] for h in hosts.values()),
+            "reused": sum(h["reused"] for h in hosts.values()),
+            "hosts": hosts,
+            "dns_hits": dns_cache.hits,
+            "dns_misses": dns_cache.misses
+        }
+
+    def cache_stats(self):
+        """
+        获取HTTP缓存统计
 
-    def make_request(self, endpoint_def):
+        Returns:
+            dict: 命中/重新验证/未命中次数，未启用缓存时返回 None
+        """
+        return self.cache.stats() if self.cache else None
+
+    def make_request(self, endpoint_def, output_path=None):
         """
         根据端点定义发送HTTP请求
 
         Args:
             endpoint_def: API端点定义字���
+            output_path: 流式响应的保存路径，默认按端点名称保存到 OUTPUT_DIR
+
+        二进制响应和超过 STREAM_JSON_THRESHOLD 的JSON响应按块写入磁盘，
+        此时 response_data 为 StreamedFile，内存占用与响应大小无关。
+        其余JSON响应经过HTTP缓存：GET请求（或端点定义中 cache 为 True 的请求）
+        带验证器时发送条件请求，304时使用缓存；没有验证器时在端点的
+        cache_ttl 内直接使用缓存。
+        连接错误、超时和 RETRY_STATUS_CODES 按 retry_policy 重试，开启对冲时
+        超过端点 p95 仍未返回的请求会再发送一次。主机或端点熔断时不发送请求，直接返回失败。
 
         Returns:
             tuple: (success, response_data, status_code, error_message)
@@ -33,30 +129,223 @@ class APIClient:
             json_data = endpoint_def.get("json_data", {})
             expect_json = endpoint_def.get("expect_json", True)
 
-            # 发送请求
-            if method == "GET":
-                response = self.session.get(url, params=params, timeout=30)
-            elif method == "POST":
-                if json_data:
-                    response = self.session.post(url, json=json_data, params=params, timeout=30)
-                else:
-                    response = self.session.post(url, params=params, timeout=30)
-            else:
+            if method not in ("GET", "POST"):
                 return False, None, None, f"不支持的HTTP方法: {method}"
 
+            # 查找缓存
+            cache_key = cache_entry = None
+            headers = {}
+            if self.cache and expect_json and endpoint_def.get("cache", method == "GET"):
+                cache_key = self.cache.make_key(method, url, params, json_data)
+                cache_entry = self.cache.lookup(cache_key)
+                if cache_entry:
+                    if self.cache.has_validators(cache_entry):
+                        headers = self.cache.conditional_headers(cache_entry)
+                    elif self.cache.is_fresh(cache_entry):
+                        self.cache.record("hit")
+                        return self._load_cached(cache_key, cache_entry)
+
+            # 主机或端点熔断时立即失败
+            host = get_host(url)
+            breaker_key = endpoint_key(endpoint_def)
+            rejected = self.circuit_breakers.allow(host, breaker_key)
+            if rejected:
+                return False, None, None, rejected
+
+            # 按主机限流后发送请求，瞬时失败按重试策略退避后重试
+            self.retry_policy.record_request(host)
+            attempt = 0
+            try:
+                while True:
+                    self.rate_limiter.acquire(host)
+                    response, error = self._attempt(endpoint_def, host, method, url, params, json_data, headers)
+                    status_code = response.status_code if response is not None else None
+                    if (not self.retry_policy.is_transient(status_code, error)
+                            or not self.retry_policy.should_retry(endpoint_def, host, attempt)):
+                        break
+                    if response is not None:
+                        response.close()
+                    time.sleep(self.retry_policy.backoff(attempt))
+                    attempt += 1
+            except BaseException:
+                # 已放行的请求必须记录结果，熔断器才不会一直把它算作未返回
+                self.circuit_breakers.record(host, breaker_key, True)
+                raise
+            self.circuit_breakers.record(host, breaker_key, is_breaker_failure(status_code))
+            if error is not None:
+                return False, None, None, error
+
+            if cache_entry and response.status_code == 304:
+                response.close()
+                self.cache.refresh(cache_key, cache_entry, response)
+                self.cache.record("revalidated")
+                return self._load_cached(cache_key, cache_entry)
+
             # 处理响应
-            if expect_json:
-                try:
-                    data = response.json()
-                    return True, data, response.status_code, None
-                except json.JSONDecodeError:
-                    return False, response.text, response.status_code, "响应不是有效的JSON"
-            else:
-                return True, response.content, response.status_code, None
+            content_length = int(response.headers.get("Content-Length") or 0)
+            if not expect_json or content_length > STREAM_JSON_THRESHOLD:
+                filepath = output_path or get_output_path(endpoint_def["name"],
+                                                          endpoint_def.get("file_ext", ".json"))
+                return self._stream_to_file(response, filepath, expect_json)
+
+            with span("download"):
+                body = response.content
+            try:
+                with span("json_decode"):
+                    data = json.loads(body)
+            except ValueError:
+                return False, response.text, response.status_code, "响应不是有效的JSON"
+
+            if cache_key:
+                self.cache.record("miss")
+                if response.status_code == 200:
+                    self.cache.store(cache_key, response, body, endpoint_def.get("cache_ttl"))
+            return True, data, response.status_code, None
 
         except requests.exceptions.RequestException as e:
             return False, None, None, str(e)
 
+    def _stream_to_file(self, response, filepath, expect_json):
+        """
+        将响应体按块写入文件
+
+        JSON响应不做完整解析，只检查首个非空白字节是否为 { 或 [，原样保存；
+        检查失败时返回响应开头的一段文本，用于错误日志。
+
+        Returns:
+            tuple: (success, StreamedFile 或错误响应文本, status_code, error_message)
+        """
+        size = 0
+        head = None
+        write_time = 0.0
+        start_time = time.perf_counter()
+        try:
+            with atomic_open(filepath, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if head is None and chunk.strip():
+                        head = chunk.lstrip()[:STREAM_ERROR_EXCERPT]
+                        if expect_json and head[:1] not in (b"{", b"["):
+                            raise ValueError("响应不是有效的JSON")
+                    write_start = time.perf_counter()
+                    f.write(chunk)
+                    write_time += time.perf_counter() - write_start
+                    size += len(chunk)
+        except ValueError as e:
+            response.close()
+            excerpt = head.decode(response.encoding or 'utf-8', 'replace') if head else None
+            return False, excerpt, response.status_code, str(e)
+        except OSError as e:
+            response.close()
+            return False, None, response.status_code, f"保存文件失败: {e}"
+
+        # 传输与写入交替进行，分别累计后记为相邻的两个阶段
+        end_time = time.perf_counter()
+        record_span("download", start_time, end_time - write_time)
+        record_span("disk_write", end_time - write_time, end_time)
+        return True, StreamedFile(filepath, size), response.status_code, None
+
+    def _attempt(self, endpoint_def, host, method, url, params, json_data, headers):
+        """
+        发送一次请求，并将耗时与结果反馈给并发控制器和超时策略
+
+        Returns:
+            tuple: (response, error_message)，连接失败或超时时 response 为 None
+        """
+        name = endpoint_key(endpoint_def)
+        timeout = self.timeouts.timeout(name)
+        start_time = time.perf_counter()
+        try:
+            with ttfb_span():
+                response = self._send_hedged(
+                    endpoint_def, host, lambda: self._send(method, url, params, json_data, headers, timeout))
+        except requests.exceptions.Timeout:
+            self.concurrency_controller.record(host, time.perf_counter() - start_time, timed_out=True)
+            self.timeouts.record_timeout(name, timeout)
+            return None, f"请求超时 (>{timeout:g}秒)"
+        except requests.exceptions.ConnectionError as e:
+            return None, str(e)
+        latency = time.perf_counter() - start_time
+        self.concurrency_controller.record(host, latency, response.status_code)
+        self.timeouts.record(name, latency)
+        return response, None
+
+    def _send_hedged(self, endpoint_def, host, send):
+        """
+        调用 send 发送请求；超过端点 p95 仍未返回时再发送一次对冲请求，
+        取先成功返回的响应，另一个响应返回后关闭
+
+        对冲请求与其他请求一样计入主机的并发窗口和限流：只有窗口有余量、
+        能立即取得令牌且重试预算允许时才发送。两次请求都在线程池中发送，
+        并记录到调用线程的追踪中。
+
+        Returns:
+            requests.Response: 响应，两次都失败时抛出第一次请求的异常
+        """
+        delay = self.retry_policy.hedge_delay(endpoint_def, self.timeouts)
+        if delay is None:
+            self._track(host, 1)
+            try:
+                return send()
+            finally:
+                self._track(host, -1)
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(thread_name_prefix="hedge")
+        send = bind_trace(send)
+        first = self._submit(host, send)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        with self._in_flight_lock:
+            window_full = self._in_flight.get(host, 0) >= self.concurrency_controller.limit(host)
+        if window_full or not self.rate_limiter.try_acquire(host):
+            return first.result()
+        if not self.retry_policy.start_hedge(host):
+            # 预算不足，令牌还给主机的正常请求
+            self.rate_limiter.release(host)
+            return first.result()
+
+        futures = [first, self._submit(host, send)]
+        winner = next((future for future in as_completed(futures) if future.exception() is None), None)
+        if winner is None:
+            return first.result()
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(_close_response)
+        if winner is not first:
+            self.retry_policy.record_hedge_win()
+        return winner.result()
+
+    def _track(self, host, delta):
+        with self._in_flight_lock:
+            self._in_flight[host] = self._in_flight.get(host, 0) + delta
+
+    def _submit(self, host, send):
+        """在线程池中发送请求，到收到响应头（或失败）为止计入主机的在途请求数"""
+        self._track(host, 1)
+        future = self._hedge_executor.submit(send)
+        future.add_done_callback(lambda _: self._track(host, -1))
+        return future
+
+    def _send(self, method, url, params, json_data, headers=None, timeout=30):
+        """发送GET或POST请求"""
+        if method == "GET":
+            return self.session.get(url, params=params, headers=headers, timeout=timeout, stream=True)
+        if json_data:
+            return self.session.post(url, json=json_data, params=params, headers=headers,
+                                     timeout=timeout, stream=True)
+        return self.session.post(url, params=params, headers=headers, timeout=timeout, stream=True)
+
+    def _load_cached(self, cache_key, cache_entry):
+        """从缓存读取响应"""
+        try:
+            body = self.cache.load_body(cache_key)
+            with span("json_decode"):
+                data = json.loads(body)
+        except (OSError, ValueError) as e:
+            return False, None, cache_entry["status_code"], f"读取缓存失败: {e}"
+        return True, data, cache_entry["status_code"], None
+
     def save_response(self, endpoint_name, data, file_ext=".json"):
         """
         保存响应数据到文件
@@ -66,17 +355,14 @@ class APIClient:
             data: 响应数据
             file_ext: 文件扩展名
         """
-        ensure_directory_exists(OUTPUT_DIR)
-
-        filename = sanitize_filename(endpoint_name) + file_ext
-        filepath = f"{OUTPUT_DIR}/{filename}"
+        filepath = get_output_path(endpoint_name, file_ext)
 
         try:
             if file_ext == ".json":
-                with open(filepath, 'w', encoding='utf-8') as f:
+                with atomic_open(filepath, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=2)
             else:
-                with open(filepath, 'wb') as f:
+                with atomic_open(filepath, 'wb') as f:
                     f.write(data)
             return filepath
         except Exception as e:
@@ -84,55 +370,73 @@ class APIClient:
             return None
 
 
-def run_api_test(endpoint_def):
+def run_api_test(endpoint_def, client=None, output=print):
     """
     运行单个API测试
 
     Args:
         endpoint_def: API端点定义
+        client: 共享的APIClient，未提供时为本次测试单独创建
+        output: 输出函数，并发模式下传入缓冲函数以避免多线程输出交错
 
     Returns:
         dict: 测试结果
     """
-    client = APIClient()
-    name = endpoint_def["name"]
+    if client is None:
+        with APIClient() as own_client:
+            return run_api_test(endpoint_def, own_client, output)
 
-    print(f"{Colors.INFO}测试: {name}{Colors.ENDC}")
+    name = endpoint_def["name"]
 
-    # 发送请求
-    success, data, status_code, error = client.make_request(endpoint_def)
+    output(f"{Colors.INFO}测试: {name}{Colors.ENDC}")
 
     result = {
         "name": name,
-        "success": success,
-        "status_code": status_code,
-        "error": error,
+        "success": False,
+        "status_code": None,
+        "error": None,
         "data_size": 0,
         "saved_file": None
     }
 
-    if success:
-        # 计算数据大小
-        result["data_size"] = len(str(data)) if data else 0
+    # 发送请求并保存响应，记录各阶段耗时
+    with trace_request(name, endpoint_def.get("url")) as trace:
+        success, data, status_code, error = client.make_request(endpoint_def)
+        result.update(success=success, status_code=status_code, error=error)
+
+        if success:
+            if isinstance(data, StreamedFile):
+                # 响应已在下载时写入磁盘
+                result["data_size"] = data.size
+                result["saved_file"] = data.path
+                size_info = format_byte_size(data.size)
+            else:
+                # 计算数据大小
+                result["data_size"] = len(str(data)) if data else 0
+
+                # 保存响应
+                file_ext = endpoint_def.get("file_ext", ".json")
+                with span("disk_write"):
+                    result["saved_file"] = client.save_response(name, data, file_ext)
+                size_info = format_response_size(data)
 
-        # 保存响应
-        file_ext = endpoint_def.get("file_ext", ".json")
-        saved_file = client.save_response(name, data, file_ext)
-        result["saved_file"] = saved_file
+    result["timing"] = trace.summary()
 
+    if success:
         # 显示成功信息
-        size_info = format_response_size(data)
-        print(f"{Colors.SUCCESS}✓ 成功 (状态码: {status_code}, 大小: {size_info}){Colors.ENDC}")
+        output(f"{Colors.SUCCESS}✓ 成功 (状态码: {status_code}, 大小: {size_info}){Colors.ENDC}")
 
-        if saved_file:
-            print(f"  保存到: {saved_file}")
+        if result["saved_file"]:
+            output(f"  保存到: {result['saved_file']}")
+        output(f"  耗时: {format_timing(result['timing'])}")
     else:
         # 显示错误信息
-        print(f"{Colors.FAIL}✗ 失败 (状态码: {status_code}){Colors.ENDC}")
+        output(f"{Colors.FAIL}✗ 失败 (状态码: {status_code}){Colors.ENDC}")
         if error:
-            print(f"  错误: {error}")
+            output(f"  错误: {error}")
+        output(f"  耗时: {format_timing(result['timing'])}")
 
-        # 记录错误到JSON文件
+        # 追加错误到JSONL日志
         error_log_entry = {
             "timestamp": datetime.now().isoformat(),
             "api_name": name,
@@ -141,9 +445,6 @@ def run_api_test(endpoint_def):
             "error_message": error,
             "response_body": data if isinstance(data, str) else "N/A"
         }
-        log_error_to_json(error_log_entry, ERROR_LOG_FILE)
-
-    # 请求间延时
-    time.sleep(REQUEST_DELAY_SECONDS)
+        error_journal.append(error_log_entry)
 
     return result
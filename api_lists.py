@@ -37,7 +37,7 @@ API_DEFINITIONS = [
      "params": {"key": API_KEY, "keyword": "邹韬奋"}},
     {"name": "[韬奋] 韬奋关系", "method": "GET",
      "url": "https://data1.library.sh.cn/webapi/zoutaofen/getRelationInterFace",
-     "params": {"key": API_KEY}},
+     "params": {"key": API_KEY}, "cache_ttl": 86400},
     {"name": "[碑帖] 碑帖检索", "method": "POST",
      "url": f"https://data1.library.sh.cn/webapi/beitie/search?key={API_KEY}",
      "json_data": {"searchType": "1", "freetext": "化度寺",
@@ -334,7 +334,7 @@ API_DEFINITIONS = [
      "params": {"key": API_KEY}},
     {"name": "[基础] 朝代列表", "method": "GET",
      "url": "https://data1.library.sh.cn/temporal.json",
-     "params": {"key": API_KEY}},
+     "params": {"key": API_KEY}, "cache_ttl": 86400},
     {"name": "[基础] 馆藏机构列表", "method": "POST",
      "url": "https://data1.library.sh.cn/organization/search",
      "params": {"freeText": "上图", "firstChar": "全部", "pageth": "1",
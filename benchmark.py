@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+基准测试 - 在本地模拟服务器上测量各执行模式的吞吐量、延迟分位数和峰值内存
+
+每个模式在独立的子进程和临时目录中运行，互不影响峰值内存和缓存。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from config import Colors, MAX_WORKERS, HOST_RATE_LIMITS, HOST_CONCURRENCY_LIMITS
+from api_lists import get_all_apis
+from adaptive_concurrency import percentile, concurrency_controller
+from rate_limiter import rate_limiter
+from mock_server import MockBehavior, start_mock_servers, rewrite_definitions, parse_throttle
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODES = ["sequential", "parallel", "parallel-cached", "monitor"]
+# 不限制客户端速率时使用的令牌桶参数
+UNLIMITED_RATE = (1e9, 1e9)
+
+
+def peak_rss_bytes():
+    """当前进程的峰值常驻内存（字节），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def configure_limits(host_map, respect_rate_limits):
+    """将按真实主机配置的限流和初始并发窗口映射到模拟服务器地址"""
+    rate_limiter.host_limits = {}
+    rate_limiter.default_limit = UNLIMITED_RATE
+    concurrency_controller.initial_limits = {}
+    for host, mock_host in host_map.items():
+        if respect_rate_limits and host in HOST_RATE_LIMITS:
+            rate_limiter.host_limits[mock_host] = HOST_RATE_LIMITS[host]
+        if host in HOST_CONCURRENCY_LIMITS:
+            concurrency_controller.initial_limits[mock_host] = HOST_CONCURRENCY_LIMITS[host]
+
+
+def run_runner(apis, parallel, workers):
+    """用 main.run_tests 运行一轮，返回每个请求的耗时（毫秒）"""
+    import main
+    results = main.run_tests(apis, parallel=parallel, max_workers=workers)
+    return [r["timing"]["total"] for r in results], sum(1 for r in results if not r["success"])
+
+
+def run_monitor(apis):
+    """用实时监控的 check_apis_batch 运行一轮，返回每个请求的耗时（毫秒）"""
+    import realtime_server
+    results = asyncio.run(realtime_server.check_apis_batch(apis))
+    return [r["response_time"] for r in results], sum(1 for r in results if r["status"] != "success")
+
+
+def run_worker(args):
+    """子进程：运行一个模式并把结果写入 --result-file"""
+    host_map = json.loads(args.host_map)
+    configure_limits(host_map, args.respect_rate_limits)
+    apis = rewrite_definitions(get_all_apis() * args.rounds, host_map)
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        if args.worker == "parallel-cached":
+            # 先运行一轮填充缓存，只统计第二轮
+            run_runner(apis, True, args.workers)
+        start = time.perf_counter()
+        if args.worker == "monitor":
+            latencies, failures = run_monitor(apis)
+        else:
+            latencies, failures = run_runner(apis, args.worker != "sequential", args.workers)
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "mode": args.worker,
+        "requests": len(latencies),
+        "failures": failures,
+        "elapsed": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "peak_rss": peak_rss_bytes()
+    }
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_mode(mode, host_map, args):
+    """在独立子进程和临时目录中运行一个模式"""
+    with tempfile.TemporaryDirectory() as workdir:
+        result_file = os.path.join(workdir, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), "--worker", mode,
+                   "--host-map", json.dumps(host_map), "--result-file", result_file,
+                   "--rounds", str(args.rounds), "--workers", str(args.workers)]
+        if args.respect_rate_limits:
+            command.append("--respect-rate-limits")
+        completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+        if completed.returncode != 0 or not os.path.exists(result_file):
+            print(f"{Colors.FAIL}模式 {mode} 运行失败:{Colors.ENDC}\n{completed.stderr}")
+            return None
+        with open(result_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def format_ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_results(results):
+    """打印结果表格"""
+    print(f"\n{'模式':<16}{'请求数':>8}{'失败':>6}{'耗时(s)':>10}{'req/s':>10}"
+          f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'峰值RSS(MB)':>14}")
+    for r in results:
+        rss = f"{r['peak_rss'] / (1024 * 1024):.1f}" if r["peak_rss"] else "-"
+        print(f"{r['mode']:<16}{r['requests']:>8}{r['failures']:>6}{r['elapsed']:>10.2f}{r['rps']:>10.1f}"
+              f"{format_ms(r['p50_ms']):>10}{format_ms(r['p95_ms']):>10}{format_ms(r['p99_ms']):>10}{rss:>14}")
+
+
+def compare_with_baseline(results, baseline_file, tolerance):
+    """
+    与基线结果比较
+
+    Returns:
+        list: 退化项说明，为空表示没有退化
+    """
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {r["mode"]: r for r in json.load(f)}
+
+    regressions = []
+    for r in results:
+        base = baseline.get(r["mode"])
+        if not base:
+            continue
+        if base["rps"] and r["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{r['mode']}: req/s {base['rps']} -> {r['rps']}")
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and r[key] and r[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{r['mode']}: {key} {base[key]} -> {r[key]}")
+        if base["peak_rss"] and r["peak_rss"] and r["peak_rss"] > base["peak_rss"] * (1 + tolerance):
+            regressions.append(f"{r['mode']}: peak_rss {base['peak_rss']} -> {r['peak_rss']}")
+    return regressions
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="在本地模拟服务器上对各执行模式进行基准测试")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"要测试的模式，逗号分隔 (默认: 全部)")
+    parser.add_argument("--rounds", type=int, default=1, help="API列表重复的次数 (默认: 1)")
+    parser.add_argument("-j", "--workers", type=int, default=MAX_WORKERS, help="并发模式的全局并发数")
+    parser.add_argument("--latency", default="lognormal:4,0.5", help="模拟服务器的延迟分布(毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务器返回500/503的概率")
+    parser.add_argument("--throttle", help="模拟服务器每个主机的限流 RATE[,BURST]")
+    parser.add_argument("--port", type=int, default=18100, help="第一个模拟主机的端口")
+    parser.add_argument("--respect-rate-limits", action="store_true",
+                        help="客户端使用 config.HOST_RATE_LIMITS 限流（默认不限流，只测客户端本身）")
+    parser.add_argument("--json", help="将结果写入JSON文件，可作为之后的基线")
+    parser.add_argument("--baseline", help="与基线JSON文件比较，出现退化时以非0状态退出")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的退化比例 (默认: 0.1)")
+    # 子进程参数
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--host-map", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    behavior = MockBehavior(args.latency, args.error_rate, parse_throttle(args.throttle))
+    servers, host_map = start_mock_servers(base_port=args.port, behavior=behavior)
+    print(f"{Colors.INFO}模拟服务器: {', '.join(f'{h} -> {a}' for h, a in host_map.items())}{Colors.ENDC}")
+
+    results = []
+    try:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            print(f"运行模式: {mode} ...")
+            result = run_mode(mode, host_map, args)
+            if result:
+                results.append(result)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.json}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\n{Colors.FAIL}性能退化 (容差 {args.tolerance:.0%}):{Colors.ENDC}")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\n{Colors.SUCCESS}与基线相比没有性能退化{Colors.ENDC}")
+
+
+if __name__ == "__main__":
+    main()
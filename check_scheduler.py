@@ -0,0 +1,144 @@
+"""
+检查调度模块 - 基于最小堆的按端点自适应检查间隔调度
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class EndpointSchedule:
+    """单个端点的调度状态"""
+
+    __slots__ = ("key", "payload", "interval", "next_due", "last_status", "stable_count", "flaps")
+
+    def __init__(self, key, payload, interval, next_due):
+        self.key = key
+        self.payload = payload
+        self.interval = interval
+        self.next_due = next_due
+        self.last_status = None
+        self.stable_count = 0
+        self.flaps = 0
+
+    def to_dict(self, now):
+        return {
+            "interval": round(self.interval, 1),
+            "due_in": round(max(self.next_due - now, 0), 1),
+            "last_status": self.last_status,
+            "stable_count": self.stable_count,
+            "flaps": self.flaps
+        }
+
+
+class CheckScheduler:
+    """
+    端点检查调度器
+
+    所有端点按下次检查时间放在一个最小堆中，每次只取出已到期的端点，
+    取出和重新放入都是 O(log n)，与端点总数无关。
+    检查结果稳定成功的端点间隔逐步乘以 backoff，直到 max_interval；
+    失败或状态来回变化的端点回到 min_interval。
+    每次重新调度的时间加入 ±jitter 比例的随机抖动，使检查在时间上分散开。
+    """
+
+    def __init__(self, base_interval, min_interval, max_interval, backoff=1.5, jitter=0.2,
+                 clock=time.monotonic):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self._clock = clock
+        self._heap = []
+        self._entries = {}
+        # 堆中时间相同时按加入顺序出堆，避免比较 EndpointSchedule
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _push(self, entry):
+        heapq.heappush(self._heap, (entry.next_due, next(self._counter), entry))
+
+    def _jittered(self, interval):
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def add(self, key, payload, delay=0.0):
+        """
+        添加端点
+
+        Args:
+            key: 端点唯一标识
+            payload: 到期时随端点返回的数据，如API定义
+            delay: 首次检查前的等待时间（秒）
+        """
+        with self._lock:
+            entry = EndpointSchedule(key, payload, self.base_interval, self._clock() + delay)
+            self._entries[key] = entry
+            self._push(entry)
+
+    def pop_due(self):
+        """
+        取出所有已到期的端点，取出后直到调用 record() 才会重新调度
+
+        Returns:
+            list: EndpointSchedule 列表，按到期时间排序
+        """
+        now = self._clock()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, entry = heapq.heappop(self._heap)
+                due.append(entry)
+        return due
+
+    def seconds_until_next(self):
+        """距离下一个端点到期的秒数，没有待调度端点时返回 None"""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(self._heap[0][0] - self._clock(), 0.0)
+
+    def record(self, key, healthy):
+        """
+        根据检查结果调整端点的检查间隔并重新调度
+
+        Args:
+            key: 端点唯一标识
+            healthy: 本次检查是否成功
+        """
+        with self._lock:
+            entry = self._entries[key]
+            changed = entry.last_status is not None and entry.last_status != healthy
+            entry.last_status = healthy
+
+            if changed:
+                entry.flaps += 1
+                entry.stable_count = 0
+            else:
+                entry.stable_count += 1
+                # 每连续3次结果不变，抵消一次之前的状态变化
+                if entry.flaps and entry.stable_count % 3 == 0:
+                    entry.flaps -= 1
+
+            if not healthy or changed or entry.flaps:
+                entry.interval = self.min_interval
+            else:
+                entry.interval = min(self.max_interval, max(entry.interval, self.base_interval) * self.backoff)
+
+            entry.next_due = self._clock() + self._jittered(entry.interval)
+            self._push(entry)
+
+    def snapshot(self):
+        """
+        获取各端点的调度状态
+
+        Returns:
+            dict: 端点 -> {"interval", "due_in", "last_status", "stable_count", "flaps"}
+        """
+        now = self._clock()
+        with self._lock:
+            return {key: entry.to_dict(now) for key, entry in self._entries.items()}
@@ -0,0 +1,215 @@
+"""
+熔断器模块 - 按主机和按端点统计连续失败，熔断后快速失败，只定期放行试探请求
+"""
+import threading
+import time
+from config import BREAKER_HOST_THRESHOLD, BREAKER_ENDPOINT_THRESHOLD, BREAKER_RESET_TIMEOUT
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_breaker_failure(status_code):
+    """
+    判断一次请求是否计为熔断器的失败：连接错误、超时（没有状态码）和5xx
+
+    4xx 说明服务器正常响应，不计为失败。
+    """
+    return status_code is None or status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    单个主机或端点的熔断器
+
+    关闭(closed)时放行所有请求，连续失败达到 threshold 次后打开(open)；
+    打开 reset_timeout 秒后进入半开(half_open)，只放行一个试探请求，
+    试探成功则关闭，失败则重新打开。试探请求超过 reset_timeout 仍未记录结果时视为丢失，
+    再放行下一个。
+
+    关闭状态下已有失败时，已失败次数加上已放行、尚未记录结果的请求数达到 threshold 后不再放行，
+    主机不可用时在熔断前最多发出 threshold 个请求，而不是再加上一整个并发窗口。
+    """
+
+    __slots__ = ("threshold", "reset_timeout", "state", "failures", "opened_at", "trial_started", "trips",
+                 "next_trial_at", "pending")
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self.trips = 0
+        # 下次放行试探请求的时间戳（time.time），在状态变化时确定，关闭时为 None
+        self.next_trial_at = None
+        # 已放行、尚未记录结果的请求数
+        self.pending = 0
+
+    def can_pass(self, now):
+        if self.state == CLOSED:
+            return self.failures == 0 or self.failures + self.pending < self.threshold
+        if self.state == OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        return self.trial_started is None or now - self.trial_started >= self.reset_timeout
+
+    def admit(self, now, wall):
+        """
+        放行一个请求，打开或半开时该请求作为试探
+
+        Returns:
+            bool: 状态是否变化
+        """
+        self.pending += 1
+        if self.state == CLOSED:
+            return False
+        changed = self.state != HALF_OPEN
+        self.state = HALF_OPEN
+        self.trial_started = now
+        self.next_trial_at = wall + self.reset_timeout
+        return changed
+
+    def record(self, failed, now, wall):
+        """
+        记录请求结果
+
+        Returns:
+            bool: 状态是否变化
+        """
+        self.pending = max(self.pending - 1, 0)
+        if not failed:
+            changed = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_started = None
+            self.next_trial_at = None
+            return changed
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+            self.state = OPEN
+            self.opened_at = now
+            self.trial_started = None
+            self.next_trial_at = wall + self.reset_timeout
+            self.trips += 1
+            return True
+        return False
+
+    def retry_in(self, now):
+        """距离放行下一个试探请求的秒数，关闭时为 None"""
+        if self.state == CLOSED:
+            return None
+        started = self.opened_at if self.state == OPEN else self.trial_started
+        if started is None:
+            return 0.0
+        return round(max(0.0, started + self.reset_timeout - now), 1)
+
+    def to_json(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "next_trial_at": round(self.next_trial_at, 1) if self.next_trial_at is not None else None
+        }
+
+
+class CircuitBreakers:
+    """
+    按主机和按端点的熔断器
+
+    请求需要主机和端点的熔断器都放行；主机整体不可用时由主机熔断器让其所有端点快速失败，
+    单个端点持续失败时只影响该端点。任何熔断器的状态变化都会使 version 加1，
+    供调用方判断是否需要推送新的熔断状态。
+
+    Args:
+        host_threshold: 主机连续失败多少次后熔断（计入该主机所有端点的请求）
+        endpoint_threshold: 端点连续失败多少次后熔断
+        reset_timeout: 熔断后多少秒放行一个试探请求
+        clock: 时钟函数，默认为 time.monotonic
+    """
+
+    def __init__(self, host_threshold=BREAKER_HOST_THRESHOLD, endpoint_threshold=BREAKER_ENDPOINT_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, clock=time.monotonic):
+        self.host_threshold = host_threshold
+        self.endpoint_threshold = endpoint_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._hosts = {}
+        self._endpoints = {}
+        self.rejected = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _breakers(self, host, endpoint):
+        host_breaker = self._hosts.get(host)
+        if host_breaker is None:
+            host_breaker = self._hosts[host] = CircuitBreaker(self.host_threshold, self.reset_timeout)
+        endpoint_breaker = self._endpoints.get(endpoint)
+        if endpoint_breaker is None:
+            endpoint_breaker = self._endpoints[endpoint] = CircuitBreaker(self.endpoint_threshold,
+                                                                          self.reset_timeout)
+        return host_breaker, endpoint_breaker
+
+    def allow(self, host, endpoint):
+        """
+        判断是否放行一个请求；放行后必须调用 record() 记录其结果
+
+        Args:
+            host: 主机
+            endpoint: 端点唯一标识
+
+        Returns:
+            str: 放行时为 None，否则为快速失败的原因
+        """
+        now = self.clock()
+        with self._lock:
+            host_breaker, endpoint_breaker = self._breakers(host, endpoint)
+            for scope, breaker in (("主机 " + host, host_breaker), ("端点", endpoint_breaker)):
+                if not breaker.can_pass(now):
+                    self.rejected += 1
+                    if breaker.state == CLOSED:
+                        return f"熔断保护: {scope} 连续失败 {breaker.failures} 次，等待 {breaker.pending} 个请求的结果"
+                    return f"熔断中: {scope} 连续失败 {breaker.failures} 次，{breaker.retry_in(now):g} 秒后试探"
+            wall = time.time()
+            for breaker in (host_breaker, endpoint_breaker):
+                if breaker.admit(now, wall):
+                    self.version += 1
+            return None
+
+    def record(self, host, endpoint, failed):
+        """
+        记录一个已放行请求的结果
+
+        Args:
+            host: 主机
+            endpoint: 端点唯一标识
+            failed: 是否失败，见 is_breaker_failure()
+        """
+        now = self.clock()
+        wall = time.time()
+        with self._lock:
+            for breaker in self._breakers(host, endpoint):
+                if breaker.record(failed, now, wall):
+                    self.version += 1
+
+    def snapshot(self):
+        """
+        导出熔断器状态
+
+        Returns:
+            dict: {"hosts": 主机 -> 状态, "endpoints": 未关闭的端点 -> 状态, "rejected": 快速失败次数,
+                   "version": 状态版本}；状态中的 next_trial_at 为下次试探的时间戳
+        """
+        with self._lock:
+            return {
+                "hosts": {host: breaker.to_json() for host, breaker in self._hosts.items()},
+                "endpoints": {endpoint: breaker.to_json() for endpoint, breaker in self._endpoints.items()
+                              if breaker.state != CLOSED},
+                "rejected": self.rejected,
+                "version": self.version
+            }
+
+
+# 进程内共享的熔断器，供 APIClient 使用
+circuit_breakers = CircuitBreakers()
@@ -0,0 +1,135 @@
+"""
+并发执行模块 - 按主机限制并发数的API测试调度
+"""
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import MAX_WORKERS
+from api_client import run_api_test
+from adaptive_concurrency import concurrency_controller
+from utils import get_host
+
+
+def is_low_priority(api_def):
+    """端点定义中 priority 为 "low"，未设置时非JSON下载（如PDF）为低优先级"""
+    return api_def.get("priority", "normal" if api_def.get("expect_json", True) else "low") == "low"
+
+
+def prioritize(apis):
+    """低优先级端点排到最后，其余保持原顺序"""
+    return sorted(apis, key=is_low_priority)
+
+
+def skipped_result(api_def):
+    """超出时间预算而未运行的端点的测试结果"""
+    return {
+        "name": api_def["name"],
+        "success": False,
+        "skipped": True,
+        "status_code": None,
+        "error": "超出本轮时间预算，已跳过",
+        "data_size": 0,
+        "saved_file": None
+    }
+
+
+def _run_buffered(api_def, client):
+    """
+    在工作线程中运行单个测试，并缓存其输出
+    """
+    lines = []
+    result = run_api_test(api_def, client, output=lines.append)
+    return result, lines
+
+
+def run_tests_concurrently(apis, client, max_workers=MAX_WORKERS, deadline=None):
+    """
+    并发运行API测试
+
+    调度在主线程中进行：按主机轮询取出待测API，只有在全局并发数未达到上限、
+    且该主机的在途请求数小于其AIMD窗口时才提交到线程池，避免工作线程阻塞在
+    某个繁忙主机上。窗口由APIClient根据每次请求的延迟和状态码实时调整。
+    每个测试的输出在完成后由主线程一次性打印，保证终端输出不交错。
+
+    设置 deadline 时，各主机的低优先级端点排在最后；到达 deadline 后不再提交
+    低优先级端点，它们记为跳过。
+
+    Args:
+        apis: API定义列表
+        client: 各工作线程共享的APIClient
+        max_workers: 全局最大并发数
+        deadline: 本轮的截止时间 (time.monotonic())，None 表示不限制
+
+    Returns:
+        list: 测试结果，顺序与输入一致
+    """
+    pending = OrderedDict()
+    indexed = list(enumerate(apis))
+    if deadline is not None:
+        indexed.sort(key=lambda item: is_low_priority(item[1]))
+    for index, api_def in indexed:
+        pending.setdefault(get_host(api_def["url"]), deque()).append((index, api_def))
+
+    results = [None] * len(apis)
+    in_flight = {host: 0 for host in pending}
+    futures = {}
+    completed = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or futures:
+            if deadline is not None and time.monotonic() >= deadline:
+                completed += _skip_low_priority(pending, results)
+
+            # 按主机轮询提交，直到全局或各主机并发数达到上限
+            submitted = True
+            while submitted and len(futures) < max_workers:
+                submitted = False
+                for host in list(pending):
+                    if len(futures) >= max_workers:
+                        break
+                    if in_flight[host] >= concurrency_controller.limit(host):
+                        continue
+                    index, api_def = pending[host].popleft()
+                    if not pending[host]:
+                        del pending[host]
+                    futures[pool.submit(_run_buffered, api_def, client)] = (index, host)
+                    in_flight[host] += 1
+                    submitted = True
+
+            if not futures:
+                continue
+            # 截止前醒来一次，及时跳过剩余的低优先级端点
+            remaining = None if deadline is None else deadline - time.monotonic()
+            done, _ = wait(futures, timeout=remaining if remaining and remaining > 0 else None,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                index, host = futures.pop(future)
+                in_flight[host] -= 1
+                completed += 1
+
+                result, lines = future.result()
+                results[index] = result
+                print(f"[{completed}/{len(apis)}] " + "\n".join(lines))
+                print()  # 空行分隔
+
+    return results
+
+
+def _skip_low_priority(pending, results):
+    """从待提交队列中移除低优先级端点并记为跳过，返回跳过的数量"""
+    skipped = 0
+    for host in list(pending):
+        remaining = deque()
+        for index, api_def in pending[host]:
+            if is_low_priority(api_def):
+                results[index] = skipped_result(api_def)
+                skipped += 1
+            else:
+                remaining.append((index, api_def))
+        if remaining:
+            pending[host] = remaining
+        else:
+            del pending[host]
+    if skipped:
+        print(f"时间预算已用完，跳过 {skipped} 个低优先级端点\n")
+    return skipped
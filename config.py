@@ -10,13 +10,123 @@ API_KEY = os.getenv('SHANGHAI_LIBRARY_API_KEY', "")
 
 # 输出配置
 OUTPUT_DIR = "api_results"
-ERROR_LOG_FILE = "log/error_log.json"
+# 错误日志为只追加的JSONL文件，超过大小或时间后轮转
+ERROR_LOG_FILE = "log/error_log.jsonl"
+ERROR_LOG_MAX_BYTES = 5 * 1024 * 1024
+ERROR_LOG_MAX_AGE_SECONDS = 7 * 24 * 3600
+# 保留的已轮转错误日志文件数，None 表示全部保留
+ERROR_LOG_MAX_FILES = None
+# 按API名称和日期统计错误次数的索引，设为 None 则不维护
+ERROR_INDEX_FILE = "log/error_index.json"
+# 旧版JSON数组格式的错误日志，读取时仍会包含
+LEGACY_ERROR_LOG_FILE = "log/error_log.json"
 
 # HTTP配置
 BASE_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
-REQUEST_DELAY_SECONDS = 2
+
+# 限流配置
+# 每个主机的令牌桶参数: (每秒请求数, 突发容量)
+DEFAULT_RATE_LIMIT = (1.0, 2)
+HOST_RATE_LIMITS = {
+    "data1.library.sh.cn": (4.0, 8),
+    "data.library.sh.cn": (2.0, 4),
+    "www.sclrd.net.cn": (1.0, 2),
+}
+
+# 并发配置
+# 并发模式下全局同时进行的请求数上限
+MAX_WORKERS = 8
+# 每个主机的初始并发窗口，可在 HOST_CONCURRENCY_LIMITS 中按主机覆盖
+MAX_CONCURRENT_PER_HOST = 4
+HOST_CONCURRENCY_LIMITS = {
+    "www.sclrd.net.cn": 2,
+}
+
+# 自适应并发 (AIMD) 配置
+# 响应健康时每轮窗口加 AIMD_INCREASE，遇到 429/503、超时或 p95 上升时乘以 AIMD_DECREASE
+AIMD_MIN_WINDOW = 1
+AIMD_MAX_WINDOW = 16
+AIMD_INCREASE = 1.0
+AIMD_DECREASE = 0.5
+# 最近 p95 超过基线的倍数，超过即视为拥塞
+AIMD_LATENCY_TOLERANCE = 2.0
+# 用于计算 p95 的最近样本数
+AIMD_SAMPLE_SIZE = 20
+# 窗口已在最小值而 p95 仍超过基线时，基线每个样本向 p95 靠拢的比例，使延迟整体上升后窗口可以恢复
+AIMD_BASELINE_DECAY = 0.1
+
+# 自适应超时配置
+# 每个端点的超时 = 最近响应时间 p99 × TIMEOUT_P99_FACTOR，限制在 [TIMEOUT_FLOOR, TIMEOUT_CEILING] 秒内；
+# 样本少于 TIMEOUT_MIN_SAMPLES 时使用 TIMEOUT_CEILING。样本保存在 TIMEOUT_STATE_FILE 中供下次运行使用
+TIMEOUT_P99_FACTOR = 3.0
+TIMEOUT_FLOOR = 2.0
+TIMEOUT_CEILING = 30.0
+TIMEOUT_MIN_SAMPLES = 5
+TIMEOUT_SAMPLE_SIZE = 50
+TIMEOUT_STATE_FILE = "cache/timeouts.json"
+
+# 一轮测试的时间预算（秒），超出后不再开始低优先级端点（端点定义中 priority 为 "low"，
+# 未设置时非JSON下载为低优先级）；None 表示不限制
+SWEEP_DEADLINE = None
+
+# 重试配置
+# 默认只重试GET请求（端点定义中 retry 为 True/False 可覆盖），连接错误、超时和 RETRY_STATUS_CODES 视为瞬时失败；
+# 第 n 次重试前等待 [0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY × 2^n)] 秒内的随机时间
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 5.0
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+# 重试预算：每次请求为其主机积累 RETRY_BUDGET_RATIO 次重试额度，最多 RETRY_BUDGET_MAX 次，
+# 额度用完后不再重试，主机故障时额外请求不超过正常请求的 RETRY_BUDGET_RATIO 倍
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MAX = 10
+# 对冲请求：请求超过端点最近响应时间的 p95 仍未返回时再发送一次，取先返回的响应，
+# 同样消耗重试预算（端点定义中 hedge 为 True/False 可覆盖）
+HEDGE_ENABLED = False
+
+# 熔断配置
+# 主机连续 BREAKER_HOST_THRESHOLD 次、或单个端点连续 BREAKER_ENDPOINT_THRESHOLD 次连接错误/超时/5xx 后熔断，
+# 熔断期间的请求立即失败，每 BREAKER_RESET_TIMEOUT 秒只放行一个试探请求，成功后恢复
+BREAKER_HOST_THRESHOLD = 5
+BREAKER_ENDPOINT_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 30.0
+
+# 连接池配置
+# 每个主机保持的连接数，应不小于该主机的并发上限
+DEFAULT_POOL_SIZE = MAX_CONCURRENT_PER_HOST
+HOST_POOL_SIZES = {
+    "data1.library.sh.cn": 8,
+}
+# DNS解析结果缓存时间（秒）
+DNS_CACHE_TTL = 300
+
+# 流式下载配置
+# 二进制响应，以及 Content-Length 超过阈值的JSON响应，按块直接写入磁盘
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_JSON_THRESHOLD = 1024 * 1024
+# 流式JSON响应校验失败时，错误日志中保留的响应开头字节数
+STREAM_ERROR_EXCERPT = 200
+
+# 请求追踪配置
+# 每个请求各阶段耗时以JSONL格式写入追踪日志
+TRACE_ENABLED = True
+TRACE_FILE = "log/traces.jsonl"
+# 追踪日志按 TRACE_MAX_BYTES 轮转，只保留最近 TRACE_MAX_FILES 个轮转文件，长时间运行的监控不会无限占用磁盘
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_MAX_FILES = 5
+
+# HTTP缓存配置
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_DIR = "cache/http"
+# 服务器未返回 ETag/Last-Modified 时的缓存有效期（秒），0 表示不缓存；
+# 可在端点定义中用 cache_ttl 单独设置
+HTTP_CACHE_DEFAULT_TTL = 0
+
+# PDF批量下载配置
+PDF_OUTPUT_DIR = "api_results/pdf"
+PDF_HARVEST_WORKERS = 4
 
 # 终端颜色配置
 class Colors:
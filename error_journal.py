@@ -0,0 +1,206 @@
+"""
+错误日志模块 - 只追加的JSONL错误日志，支持按大小/时间轮转、按API和日期的索引及流式读取
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from config import (ERROR_LOG_FILE, ERROR_LOG_MAX_BYTES, ERROR_LOG_MAX_AGE_SECONDS,
+                    ERROR_LOG_MAX_FILES, ERROR_INDEX_FILE, LEGACY_ERROR_LOG_FILE)
+from utils import ensure_directory_exists, atomic_open
+
+
+def _rotated_files(log_file):
+    """按时间顺序列出已轮转的日志文件"""
+    base, ext = os.path.splitext(log_file)
+    return sorted(glob.glob(f"{glob.escape(base)}.*{ext}"))
+
+
+class ErrorJournal:
+    """
+    只追加的JSONL错误日志
+
+    每条错误写为一行JSON，以追加模式单次写入，不需要读取已有内容。
+    当前文件超过 max_bytes，或首条记录早于 max_age 秒时，重命名为
+    <name>.<时间戳>.jsonl 后开始新文件；max_files 不为 None 时只保留最近的
+    max_files 个轮转文件，更早的在轮转时删除。
+    可选维护 {api_name: {日期: 次数}} 的索引，在关闭或进程退出时写入。
+    """
+
+    def __init__(self, log_file=ERROR_LOG_FILE, max_bytes=ERROR_LOG_MAX_BYTES,
+                 max_age=ERROR_LOG_MAX_AGE_SECONDS, index_file=ERROR_INDEX_FILE, max_files=ERROR_LOG_MAX_FILES):
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_files = max_files
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._index = None
+        self._index_dirty = False
+        if index_file:
+            atexit.register(self.flush_index)
+
+    def append(self, entry):
+        """
+        追加一条错误记录
+
+        Args:
+            entry (dict): 错误信息，应包含 timestamp 和 api_name
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            ensure_directory_exists(os.path.dirname(self.log_file))
+            self._rotate_if_needed()
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+            if self._started_at is None:
+                self._started_at = self._parse_timestamp(entry)
+            if self.index_file:
+                self._add_to_index(entry)
+
+    @staticmethod
+    def _parse_timestamp(entry):
+        try:
+            return datetime.fromisoformat(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return datetime.now()
+
+    def _rotate_if_needed(self):
+        try:
+            size = os.path.getsize(self.log_file)
+        except OSError:
+            self._started_at = None
+            return
+        if size == 0:
+            return
+
+        if self._started_at is None:
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                try:
+                    self._started_at = self._parse_timestamp(json.loads(f.readline()))
+                except ValueError:
+                    self._started_at = datetime.now()
+
+        too_old = (datetime.now() - self._started_at).total_seconds() >= self.max_age
+        if size >= self.max_bytes or too_old:
+            base, ext = os.path.splitext(self.log_file)
+            rotated = f"{base}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+            os.replace(self.log_file, rotated)
+            self._started_at = None
+            self._prune_rotated()
+
+    def _prune_rotated(self):
+        if self.max_files is None:
+            return
+        rotated = _rotated_files(self.log_file)
+        for path in rotated[:max(len(rotated) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _add_to_index(self, entry):
+        index = self._load_index()
+        day = str(entry.get("timestamp", ""))[:10] or datetime.now().date().isoformat()
+        days = index.setdefault(entry.get("api_name", "Unknown"), {})
+        days[day] = days.get(day, 0) + 1
+        self._index_dirty = True
+
+    def flush_index(self):
+        """将索引写入磁盘"""
+        with self._lock:
+            if not self._index_dirty:
+                return
+            with atomic_open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False, indent=2)
+            self._index_dirty = False
+
+    def load_index(self):
+        """
+        获取按API名称和日期统计的错误次数
+
+        Returns:
+            dict: {api_name: {"YYYY-MM-DD": 次数}}
+        """
+        with self._lock:
+            return json.loads(json.dumps(self._load_index()))
+
+
+def iter_errors(log_file=ERROR_LOG_FILE, since=None, api_name=None):
+    """
+    按时间顺序流式读取错误记录，依次读取旧版JSON数组日志、已轮转的文件和当前文件，
+    每次只在内存中保留一行
+
+    Args:
+        log_file: 当前日志文件路径
+        since: 只返回该时间之后的记录 (datetime)
+        api_name: 只返回该API的记录
+
+    Yields:
+        dict: 错误记录
+    """
+    files = _rotated_files(log_file)
+    if since is not None:
+        # 轮转文件名中的时间戳是该文件的结束时间，早于 since 的整个文件可以跳过
+        stamp = since.strftime('%Y%m%d-%H%M%S')
+        base = os.path.splitext(log_file)[0]
+        files = [path for path in files if path[len(base) + 1:] >= stamp]
+
+    def matches(entry):
+        if api_name is not None and entry.get("api_name") != api_name:
+            return False
+        if since is not None and str(entry.get("timestamp", "")) < since.isoformat():
+            return False
+        return True
+
+    if LEGACY_ERROR_LOG_FILE and os.path.exists(LEGACY_ERROR_LOG_FILE):
+        try:
+            with open(LEGACY_ERROR_LOG_FILE, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            legacy = []
+        for entry in legacy if isinstance(legacy, list) else []:
+            if isinstance(entry, dict) and matches(entry):
+                yield entry
+
+    for path in files + [log_file]:
+        try:
+            f = open(path, 'r', encoding='utf-8')
+        except OSError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 写入中断留下的半行
+                    continue
+                if matches(entry):
+                    yield entry
+
+
+def tail_errors(limit, log_file=ERROR_LOG_FILE, since=None):
+    """
+    获取最近的若干条错误记录
+
+    Returns:
+        list: 最多 limit 条记录，按时间顺序
+    """
+    return list(deque(iter_errors(log_file, since=since), maxlen=limit))
+
+
+# 进程内共享的错误日志
+error_journal = ErrorJournal()
@@ -6,6 +6,10 @@ import os
 import sys
 from pathlib import Path
 from datetime import datetime
+from error_journal import tail_errors
+
+# Only the most recent errors are shown on the dashboard
+MAX_DASHBOARD_ERRORS = 500
 
 # Handle Windows console encoding
 if sys.platform == 'win32':
@@ -97,20 +101,12 @@ def scan_results_directory():
     return apis, categories
 
 
-def load_error_logs():
-    """Load error logs from log/error_log.json"""
-    error_log_path = Path('log/error_log.json')
-    errors = []
-
-    if error_log_path.exists():
-        try:
-            with open(error_log_path, 'r', encoding='utf-8') as f:
-                error_data = json.load(f)
-                errors = error_data if isinstance(error_data, list) else []
-        except:
-            pass
-
-    return errors
+def load_error_logs(limit=MAX_DASHBOARD_ERRORS):
+    """Load the most recent error log entries, streaming through the JSONL journal"""
+    try:
+        return tail_errors(limit)
+    except OSError:
+        return []
 
 
 def generate_dashboard_data():
@@ -0,0 +1,131 @@
+"""
+HTTP缓存模块 - 基于ETag/Last-Modified条件请求和TTL的磁盘缓存
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from config import HTTP_CACHE_DIR, HTTP_CACHE_DEFAULT_TTL
+from utils import atomic_open, strip_api_key
+
+
+class HTTPCache:
+    """
+    磁盘HTTP缓存
+
+    每个请求对应 <key>.json（元数据）和 <key>.body（原始响应体）两个文件。
+    有验证器（ETag/Last-Modified）的条目每次都发送条件请求重新验证；
+    没有验证器的条目在TTL内直接命中，不发送请求。
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, default_ttl=HTTP_CACHE_DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(method, url, params=None, json_data=None):
+        """根据请求方法、URL和参数生成缓存键"""
+        raw = json.dumps([method, url, params or {}, json_data or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def lookup(self, key):
+        """
+        查找缓存条目
+
+        Returns:
+            dict: 元数据，不存在或已损坏时返回 None
+        """
+        try:
+            with open(self._path(key, ".json"), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not os.path.exists(self._path(key, ".body")):
+            return None
+        return entry
+
+    @staticmethod
+    def has_validators(entry):
+        """条目是否带有可用于条件请求的验证器"""
+        return bool(entry.get("etag") or entry.get("last_modified"))
+
+    @staticmethod
+    def is_fresh(entry):
+        """没有验证器的条目是否仍在TTL内"""
+        return time.time() - entry["stored_at"] < entry["ttl"]
+
+    @staticmethod
+    def conditional_headers(entry):
+        """构造条件请求头"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load_body(self, key):
+        """读取缓存的响应体"""
+        with open(self._path(key, ".body"), 'rb') as f:
+            return f.read()
+
+    def store(self, key, response, body, ttl=None):
+        """
+        保存响应到缓存
+
+        Args:
+            key: 缓存键
+            response: requests.Response，用于读取验证器
+            body: 原始响应体
+            ttl: 没有验证器时的有效期（秒），默认 HTTP_CACHE_DEFAULT_TTL
+        """
+        entry = {
+            "url": strip_api_key(response.url),
+            "status_code": response.status_code,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "ttl": self.default_ttl if ttl is None else ttl
+        }
+        if not self.has_validators(entry) and entry["ttl"] <= 0:
+            return
+        with atomic_open(self._path(key, ".body"), 'wb') as f:
+            f.write(body)
+        with atomic_open(self._path(key, ".json"), 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+    def refresh(self, key, entry, response):
+        """收到304后更新条目的验证器和存储时间"""
+        entry["etag"] = response.headers.get("ETag") or entry.get("etag")
+        entry["last_modified"] = response.headers.get("Last-Modified") or entry.get("last_modified")
+        entry["stored_at"] = time.time()
+        with atomic_open(self._path(key, ".json"), 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+    def record(self, outcome):
+        """
+        记录一次缓存结果
+
+        Args:
+            outcome: "hit"、"miss" 或 "revalidated"
+        """
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """获取缓存命中统计"""
+        with self._lock:
+            return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
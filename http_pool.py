@@ -0,0 +1,168 @@
+"""
+连接池模块 - 按主机配置的长连接会话、DNS缓存及连接复用统计
+"""
+import socket
+import threading
+import time
+import requests
+from config import BASE_HEADERS, DEFAULT_POOL_SIZE, HOST_POOL_SIZES, DNS_CACHE_TTL
+from request_tracing import TracedHTTPAdapter, record_span
+
+
+class DNSCache:
+    """
+    进程内DNS缓存
+
+    安装后替换 socket.getaddrinfo，在TTL内复用解析结果。
+    支持多次安装，引用计数归零时恢复原始函数。
+    """
+
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._original = None
+        self._installs = 0
+
+    def install(self):
+        """安装DNS缓存"""
+        with self._lock:
+            if self._installs == 0:
+                self.hits = 0
+                self.misses = 0
+                self._original = socket.getaddrinfo
+                socket.getaddrinfo = self._getaddrinfo
+            self._installs += 1
+
+    def uninstall(self):
+        """卸载DNS缓存，恢复原始解析函数"""
+        with self._lock:
+            if self._installs == 0:
+                return
+            self._installs -= 1
+            if self._installs == 0:
+                socket.getaddrinfo = self._original
+                self._original = None
+                self._cache.clear()
+
+    def _getaddrinfo(self, host, port, *args, **kwargs):
+        key = (host, port, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            resolve = self._original or socket.getaddrinfo
+
+        start = time.perf_counter()
+        result = resolve(host, port, *args, **kwargs)
+        record_span("dns", start, time.perf_counter(), host=host)
+        with self._lock:
+            self._cache[key] = (now + self.ttl, result)
+        return result
+
+
+dns_cache = DNSCache()
+
+
+def build_session(pool_sizes=None, default_pool_size=DEFAULT_POOL_SIZE):
+    """
+    创建带连接池的会话
+
+    默认适配器处理未单独配置的主机，HOST_POOL_SIZES 中的主机各自挂载
+    独立的适配器。连接在请求结束后归还连接池，后续请求通过 keep-alive 复用。
+    新建连接的TCP连接和TLS握手耗时会记录到当前线程的请求追踪中。
+
+    Args:
+        pool_sizes: 主机 -> 连接池大小，默认使用 HOST_POOL_SIZES
+        default_pool_size: 未单独配置主机的连接池大小
+
+    Returns:
+        requests.Session: 配置好的会话
+    """
+    if pool_sizes is None:
+        pool_sizes = HOST_POOL_SIZES
+
+    session = requests.Session()
+    session.headers.update(BASE_HEADERS)
+    session.headers["Connection"] = "keep-alive"
+
+    default_adapter = TracedHTTPAdapter(pool_maxsize=default_pool_size)
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+
+    for host, size in pool_sizes.items():
+        adapter = TracedHTTPAdapter(pool_connections=1, pool_maxsize=size)
+        session.mount(f"http://{host}/", adapter)
+        session.mount(f"https://{host}/", adapter)
+
+    return session
+
+
+def collect_connection_stats(session):
+    """
+    统计会话中各主机新建与复用的连接数，包括 evict_host() 已移除的连接池
+
+    Args:
+        session: requests.Session
+
+    Returns:
+        dict: 主机 -> {"opened": 新建连接数, "reused": 复用连接数}
+    """
+    stats = {host: dict(host_stats) for host, host_stats in getattr(session, "evicted_stats", {}).items()}
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                _add_pool_stats(stats, pool)
+    return stats
+
+
+def _add_pool_stats(stats, pool):
+    host_stats = stats.setdefault(pool.host, {"opened": 0, "reused": 0})
+    host_stats["opened"] += pool.num_connections
+    host_stats["reused"] += max(pool.num_requests - pool.num_connections, 0)
+
+
+def evict_host(session, host):
+    """
+    关闭并移除会话中某个主机的连接池，下次请求时重新建立连接
+
+    出错的单个连接 urllib3 已经丢弃，无需调用本函数；它用于整个主机的连接都不可用时。
+    移除前连接池的新建/复用计数累计到 session.evicted_stats，collect_connection_stats() 仍会计入。
+
+    Args:
+        session: requests.Session
+        host: 主机名，可带端口，如 get_host() 的返回值
+
+    Returns:
+        int: 移除的连接池数量
+    """
+    evicted = 0
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None and host in (pool.host, f"{pool.host}:{pool.port}"):
+                if not hasattr(session, "evicted_stats"):
+                    session.evicted_stats = {}
+                _add_pool_stats(session.evicted_stats, pool)
+                # RecentlyUsedContainer 在删除时关闭连接池
+                del pools[key]
+                evicted += 1
+    return evicted
@@ -4,9 +4,15 @@
 主程序入口点
 """
 import sys
-from config import Colors
+import time
+import argparse
+from config import Colors, MAX_WORKERS, SWEEP_DEADLINE
 from api_lists import get_all_apis
-from api_client import run_api_test
+from api_client import APIClient, run_api_test
+from concurrent_runner import run_tests_concurrently, is_low_priority, prioritize, skipped_result
+from adaptive_concurrency import concurrency_controller
+from retry_policy import retry_policy
+from circuit_breaker import circuit_breakers, CLOSED
 
 
 def print_banner():
@@ -18,43 +24,110 @@ def print_banner():
     print("=" * 60)
     print(f"{Colors.ENDC}")
 
-def run_tests(apis, category_name="所有"):
+def run_tests(apis, category_name="所有", parallel=False, max_workers=MAX_WORKERS, use_cache=True,
+              deadline_seconds=SWEEP_DEADLINE):
     """
     运行API测试
 
     Args:
         apis: API定义列表
         category_name: 类别名称
+        parallel: 是否使用并发模式
+        max_workers: 并发模式下的全局最大并发数
+        use_cache: 是否使用HTTP缓存
+        deadline_seconds: 本轮的时间预算（秒），用完后跳过剩余的低优先级端点；None 表示不限制
     """
     if not apis:
         print(f"{Colors.WARNING}没有找到要测试的API{Colors.ENDC}")
         return
 
-    print(f"\n{Colors.INFO}开始测试 {category_name} API ({len(apis)} 个)...{Colors.ENDC}\n")
+    mode = f"并发模式, 最大并发 {max_workers}" if parallel else "顺序模式"
+    print(f"\n{Colors.INFO}开始测试 {category_name} API ({len(apis)} 个, {mode})...{Colors.ENDC}\n")
 
-    results = []
-    success_count = 0
+    start_time = time.perf_counter()
+    deadline = None if deadline_seconds is None else time.monotonic() + deadline_seconds
 
-    for i, api_def in enumerate(apis, 1):
-        print(f"[{i}/{len(apis)}] ", end="")
-        result = run_api_test(api_def)
-        results.append(result)
+    # 整个运行期间共享一个客户端，复用连接池
+    with APIClient(use_cache=use_cache) as client:
+        if parallel:
+            results = run_tests_concurrently(apis, client, max_workers=max_workers, deadline=deadline)
+        else:
+            results = []
+            for i, api_def in enumerate(apis if deadline is None else prioritize(apis), 1):
+                if deadline is not None and time.monotonic() >= deadline and is_low_priority(api_def):
+                    results.append(skipped_result(api_def))
+                    continue
+                print(f"[{i}/{len(apis)}] ", end="")
+                results.append(run_api_test(api_def, client))
+                print()  # 空行分隔
 
-        if result["success"]:
-            success_count += 1
+        print_summary(results, time.perf_counter() - start_time, client.connection_stats(),
+                      client.cache_stats())
+    return results
 
-        print()  # 空行分隔
 
-    # 打印总结
+def print_summary(results, elapsed, connection_stats, cache_stats=None):
+    """
+    打印测试总结
+
+    Args:
+        results: 测试结果列表
+        elapsed: 总耗时（秒）
+        connection_stats: 连接复用统计
+        cache_stats: HTTP缓存统计，未启用缓存时为 None
+    """
+    total = len(results)
+    success_count = sum(1 for r in results if r["success"])
+    skipped_count = sum(1 for r in results if r.get("skipped"))
+
     print(f"{Colors.INFO}=" * 60)
     print(f"测试完成!")
-    print(f"总数: {len(apis)}, 成功: {success_count}, 失败: {len(apis) - success_count}")
-    print(f"成功率: {success_count / len(apis) * 100:.1f}%")
+    print(f"总数: {total}, 成功: {success_count}, 失败: {total - success_count - skipped_count}"
+          + (f", 跳过: {skipped_count}" if skipped_count else ""))
+    print(f"成功率: {success_count / total * 100:.1f}%")
+    print(f"总耗时: {elapsed:.1f} 秒")
+    print(f"连接: 新建 {connection_stats['opened']}, 复用 {connection_stats['reused']}")
+    for host, host_stats in sorted(connection_stats["hosts"].items()):
+        print(f"  {host}: 新建 {host_stats['opened']}, 复用 {host_stats['reused']}")
+    print(f"DNS缓存: 命中 {connection_stats['dns_hits']}, 解析 {connection_stats['dns_misses']}")
+    if cache_stats:
+        print(f"缓存: 命中 {cache_stats['hits']}, 重新验证 {cache_stats['revalidated']}, "
+              f"未命中 {cache_stats['misses']}")
+    for host, window in sorted(concurrency_controller.snapshot().items()):
+        print(f"并发窗口 {host}: {window['window']} "
+              f"(p95: {window['p95']}s, 扩大 {window['increases']} 次, 收缩 {window['decreases']} 次)")
+    retry_stats = retry_policy.stats()
+    if any(retry_stats.values()):
+        print(f"重试: {retry_stats['retries']} 次, 预算不足放弃 {retry_stats['exhausted']} 次, "
+              f"对冲请求 {retry_stats['hedges']} 次 (先返回 {retry_stats['hedge_wins']} 次)")
+    circuits = circuit_breakers.snapshot()
+    for host, breaker in sorted(circuits["hosts"].items()):
+        if breaker["state"] != CLOSED or breaker["trips"]:
+            print(f"熔断 {host}: {breaker['state']} (熔断 {breaker['trips']} 次)")
+    if circuits["endpoints"]:
+        print(f"熔断中的端点: {', '.join(sorted(circuits['endpoints']))}")
+    if circuits["rejected"]:
+        print(f"熔断快速失败: {circuits['rejected']} 次")
     print(f"={Colors.ENDC}" * 60)
 
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="上海图书馆开放数据API测试工具")
+    parser.add_argument("-p", "--parallel", action="store_true",
+                        help="并发测试，按主机限制同时进行的请求数")
+    parser.add_argument("-j", "--workers", type=int, default=MAX_WORKERS,
+                        help=f"并发模式下的全局最大并发数 (默认: {MAX_WORKERS})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用HTTP缓存，所有请求都完整下载")
+    parser.add_argument("--deadline", type=float, default=SWEEP_DEADLINE, metavar="SECONDS",
+                        help="本轮测试的时间预算，用完后跳过剩余的低优先级端点（如PDF下载）")
+    return parser.parse_args()
+
+
 def main():
     """主函数"""
+    args = parse_args()
     print_banner()
 
     # 默认测试所有API
@@ -62,7 +135,8 @@ def main():
     category_name = "所有"
 
     try:
-        run_tests(apis, category_name)
+        run_tests(apis, category_name, parallel=args.parallel, max_workers=args.workers,
+                  use_cache=not args.no_cache, deadline_seconds=args.deadline)
     except KeyboardInterrupt:
         print(f"\n{Colors.WARNING}用户中断测试{Colors.ENDC}")
     except Exception as e:
@@ -0,0 +1,156 @@
+"""
+监控指标模块 - 以Prometheus文本格式导出检查的响应时间直方图、结果计数和传输字节数，
+每次检查的更新都是 O(1)
+"""
+import bisect
+import threading
+
+# 响应时间直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 调度延迟直方图的桶上界（秒）：端点到期到实际开始检查
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    """转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metric_lines(name, metric_type, help_text, samples):
+    """
+    生成一个指标的文本格式
+
+    Args:
+        name: 指标名
+        metric_type: counter、gauge 或 histogram
+        help_text: 说明
+        samples: (标签元组, 值) 的列表，标签元组为 ((名称, 值), ...)；直方图为 (标签元组, Histogram)
+
+    Returns:
+        list: 文本行
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+    for labels, value in samples:
+        if metric_type == 'histogram':
+            lines.extend(value.lines(name, labels))
+        else:
+            lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+    return lines
+
+
+class Histogram:
+    """固定桶的直方图，observe() 只更新一个桶"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # 最后一个为超过所有上界的 +Inf 桶
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        lines = []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", format_value(bound)),))} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {format_value(self.sum)}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+
+class ProbeMetrics:
+    """
+    检查结果的累计指标
+
+    作为 StatusStore 的写入回调，每次检查按端点和分类更新响应时间直方图，
+    按结果累加计数和响应字节数；调度延迟由调用方通过 observe_lag() 记录。
+    render() 输出这些指标的Prometheus文本格式。
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, lag_buckets=LAG_BUCKETS):
+        self.latency_buckets = latency_buckets
+        # (端点, 分类) -> Histogram
+        self._endpoint_latency = {}
+        # 分类 -> Histogram
+        self._category_latency = {}
+        # (端点, 分类, 结果) -> 次数
+        self._probes = {}
+        # (端点, 分类) -> 字节数
+        self._bytes = {}
+        self._lag = Histogram(lag_buckets)
+        self._lock = threading.Lock()
+
+    def record(self, seq, key, result, significant):
+        """记录一次检查结果，可作为 StatusStore 的写入回调；跳过重启后恢复的旧结果和熔断时的快速失败"""
+        if result.get('stale') or result.get('circuit_open'):
+            return
+        endpoint = (result['name'], result['category'])
+        # 超时和连接错误没有响应，其 response_time 不是响应时间，只计入结果计数
+        response_time = result.get('response_time') if result.get('status_code') is not None else None
+        with self._lock:
+            if response_time is not None:
+                histogram = self._endpoint_latency.get(endpoint)
+                if histogram is None:
+                    histogram = self._endpoint_latency[endpoint] = Histogram(self.latency_buckets)
+                histogram.observe(response_time / 1000)
+                histogram = self._category_latency.get(result['category'])
+                if histogram is None:
+                    histogram = self._category_latency[result['category']] = Histogram(self.latency_buckets)
+                histogram.observe(response_time / 1000)
+            probe = endpoint + (result['status'],)
+            self._probes[probe] = self._probes.get(probe, 0) + 1
+            self._bytes[endpoint] = self._bytes.get(endpoint, 0) + (result.get('bytes_read', result.get('size')) or 0)
+
+    def observe_lag(self, seconds):
+        """记录一次调度延迟：端点到期到实际开始检查的秒数"""
+        with self._lock:
+            self._lag.observe(max(seconds, 0.0))
+
+    def render(self):
+        """
+        输出Prometheus文本格式
+
+        Returns:
+            str: 以换行结尾的文本
+        """
+        with self._lock:
+            lines = metric_lines(
+                'api_monitor_probe_duration_seconds', 'histogram', 'Probe response time per endpoint.',
+                [((('endpoint', name), ('category', category)), histogram)
+                 for (name, category), histogram in self._endpoint_latency.items()])
+            lines += metric_lines(
+                'api_monitor_category_probe_duration_seconds', 'histogram', 'Probe response time per category.',
+                [((('category', category),), histogram) for category, histogram in self._category_latency.items()])
+            lines += metric_lines(
+                'api_monitor_probes_total', 'counter', 'Probes by result (success, error, timeout).',
+                [((('endpoint', name), ('category', category), ('status', status)), count)
+                 for (name, category, status), count in self._probes.items()])
+            lines += metric_lines(
+                'api_monitor_response_bytes_total', 'counter', 'Response bytes received by probes.',
+                [((('endpoint', name), ('category', category)), size)
+                 for (name, category), size in self._bytes.items()])
+            lines += metric_lines(
+                'api_monitor_scheduler_lag_seconds', 'histogram',
+                'Delay between an endpoint becoming due and its probe starting.', [((), self._lag)])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+模拟服务器 - 用 api_results/ 中记录的响应模拟上海图书馆开放数据API，
+支持可配置的延迟分布、错误注入和限流，用于在本地测试和压测客户端
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, unquote
+from config import Colors, OUTPUT_DIR
+from api_lists import get_all_apis
+from rate_limiter import TokenBucket
+from utils import get_host, sanitize_filename, API_KEY_PARAMS
+
+DEFAULT_BASE_PORT = 18000
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), OUTPUT_DIR)
+
+
+def parse_latency(spec):
+    """
+    解析延迟分布，单位为毫秒
+
+    支持 fixed:50、uniform:20,200、lognormal:4,0.5（对数正态分布的 mu,sigma）
+
+    Returns:
+        callable: 每次调用返回一个延迟（秒）
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(values[0], values[1]) / 1000
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+
+class MockBehavior:
+    """模拟服务器的行为配置：延迟、错误率和限流"""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, throttle=None):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        # throttle 为每个主机的 (每秒请求数, 突发容量)，超出时返回 429
+        self.throttle = throttle
+
+
+def _flatten_params(query="", params=None, json_data=None):
+    """
+    合并查询字符串、查询参数和JSON请求体的顶层字段，去掉API密钥，值统一转为字符串
+
+    Returns:
+        dict: 参数名 -> 值
+    """
+    merged = dict(parse_qsl(query, keep_blank_values=True))
+    for source in (params, json_data):
+        if isinstance(source, dict):
+            merged.update((name, str(value)) for name, value in source.items())
+    return {name: value for name, value in merged.items() if name not in API_KEY_PARAMS}
+
+
+def load_routes(apis=None, results_dir=RESULTS_DIR):
+    """
+    根据API定义建立路由表
+
+    同一路径上可能有多个端点（如只是查询参数不同），每个路由带上其定义中的参数，
+    请求按参数匹配最具体的一个，见 match_route()。
+
+    Returns:
+        dict: (host, path) -> 路由列表，每项为 {"params": 参数, "file": 记录的响应文件, "content_type": 类型}，
+              参数多的在前
+    """
+    routes = {}
+    for api_def in apis or get_all_apis():
+        parts = urlsplit(api_def["url"])
+        file_ext = api_def.get("file_ext", ".json")
+        routes.setdefault((parts.netloc.lower(), parts.path), []).append({
+            "params": _flatten_params(parts.query, api_def.get("params"), api_def.get("json_data")),
+            "file": os.path.join(results_dir, sanitize_filename(api_def["name"]) + file_ext),
+            "content_type": "application/json;charset=UTF-8" if file_ext == ".json" else "application/pdf"
+        })
+    for candidates in routes.values():
+        candidates.sort(key=lambda route: len(route["params"]), reverse=True)
+    return routes
+
+
+def match_route(routes, host, path, params):
+    """
+    查找请求对应的路由：定义中的参数全部出现在请求中且取值相同的路由里参数最多的一个；
+    都不匹配时返回该路径的第一个路由
+
+    Args:
+        routes: load_routes() 的结果
+        host: 上游主机
+        path: 请求路径
+        params: 请求参数，见 _flatten_params()
+
+    Returns:
+        dict: 路由，路径不存在时为 None
+    """
+    candidates = routes.get((host, path))
+    if not candidates:
+        return None
+    for route in candidates:
+        if all(params.get(name) == value for name, value in route["params"].items()):
+            return route
+    return candidates[0]
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """返回记录的响应，按服务器的 MockBehavior 注入延迟、错误和限流"""
+
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，避免Nagle算法与延迟ACK叠加出约40ms的额外延迟
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = self.rfile.read(length) if length else b""
+        try:
+            json_data = json.loads(request_body) if request_body else None
+        except ValueError:
+            json_data = None
+
+        server = self.server
+        behavior = server.behavior
+
+        if server.bucket and not server.bucket.try_acquire():
+            return self._send(429, b'{"msg": "Too Many Requests"}', "application/json", {"Retry-After": "1"})
+
+        time.sleep(behavior.latency())
+
+        if behavior.error_rate and random.random() < behavior.error_rate:
+            return self._send(random.choice((500, 503)), b'{"msg": "injected error"}', "application/json")
+
+        parts = urlsplit(self.path)
+        route = match_route(server.routes, server.upstream_host, unquote(parts.path),
+                            _flatten_params(parts.query, json_data=json_data))
+        if route is None:
+            return self._send(404, b'{"msg": "Not Found"}', "application/json")
+
+        body = server.load_body(route)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", None, {"ETag": etag})
+        self._send(200, body, route["content_type"], {"ETag": etag})
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    """模拟某一个上游主机的服务器"""
+
+    daemon_threads = True
+
+    def __init__(self, port, upstream_host, routes, behavior):
+        super().__init__(("127.0.0.1", port), MockAPIHandler)
+        self.upstream_host = upstream_host
+        self.routes = routes
+        self.behavior = behavior
+        self.bucket = TokenBucket(*behavior.throttle) if behavior.throttle else None
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def load_body(self, route):
+        """读取并缓存记录的响应，没有记录时生成占位内容"""
+        with self._lock:
+            body = self._bodies.get(route["file"])
+            if body is None:
+                try:
+                    with open(route["file"], "rb") as f:
+                        body = f.read()
+                except OSError:
+                    if route["content_type"] == "application/pdf":
+                        body = b"%PDF-1.4\n" + b"0" * 64 * 1024 + b"\n%%EOF\n"
+                    else:
+                        body = json.dumps({"state": 0, "msg": None, "data": []}).encode("utf-8")
+                self._bodies[route["file"]] = body
+            return body
+
+    def handle_error(self, request, client_address):
+        # 客户端只读取部分响应后断开连接属于正常情况（如限量读取的健康检查）
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def start_mock_servers(apis=None, base_port=DEFAULT_BASE_PORT, behavior=None):
+    """
+    为API定义中的每个主机启动一个模拟服务器
+
+    Returns:
+        tuple: (服务器列表, 上游主机 -> 模拟服务器地址 "127.0.0.1:端口")
+    """
+    apis = apis or get_all_apis()
+    routes = load_routes(apis)
+    behavior = behavior or MockBehavior()
+
+    servers = []
+    host_map = {}
+    for offset, host in enumerate(sorted({get_host(api_def["url"]) for api_def in apis})):
+        server = MockServer(base_port + offset, host, routes, behavior)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        host_map[host] = f"127.0.0.1:{base_port + offset}"
+    return servers, host_map
+
+
+def rewrite_definitions(apis, host_map):
+    """
+    将API定义中的URL指向模拟服务器
+
+    Returns:
+        list: 新的API定义列表，原列表不变
+    """
+    rewritten = []
+    for api_def in apis:
+        api_def = copy.deepcopy(api_def)
+        parts = urlsplit(api_def["url"])
+        mock_host = host_map.get(parts.netloc.lower())
+        if mock_host:
+            api_def["url"] = urlunsplit(("http", mock_host, parts.path, parts.query, parts.fragment))
+        rewritten.append(api_def)
+    return rewritten
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="用记录的响应模拟上海图书馆开放数据API")
+    parser.add_argument("--port", type=int, default=DEFAULT_BASE_PORT,
+                        help=f"第一个模拟主机的端口，其余主机依次递增 (默认: {DEFAULT_BASE_PORT})")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="延迟分布(毫秒): fixed:50、uniform:20,200 或 lognormal:4,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500/503的概率")
+    parser.add_argument("--throttle", help="每个主机的限流 RATE[,BURST]，超出时返回429")
+    return parser.parse_args()
+
+
+def parse_throttle(spec):
+    """解析 RATE[,BURST] 格式的限流参数"""
+    if not spec:
+        return None
+    rate, _, burst = spec.partition(",")
+    return float(rate), float(burst or rate)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    behavior = MockBehavior(args.latency, args.error_rate, parse_throttle(args.throttle))
+    servers, host_map = start_mock_servers(base_port=args.port, behavior=behavior)
+
+    print(f"{Colors.INFO}模拟服务器已启动:{Colors.ENDC}")
+    for host, address in host_map.items():
+        print(f"  {host} -> http://{address}")
+    print("按 Ctrl+C 停止")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
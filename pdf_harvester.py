@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+PDF批量下载工具 - 根据PDF资源目录信息并发下载整本PDF的所有分页
+"""
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import API_KEY, Colors, PDF_OUTPUT_DIR, PDF_HARVEST_WORKERS
+from api_client import APIClient
+from utils import ensure_directory_exists, sanitize_filename, format_byte_size, atomic_open
+
+PDF_INFO_URL = "https://data1.library.sh.cn/service_pdf_race/race/pdf/info"
+PDF_STREAM_URL = "https://data1.library.sh.cn/service_pdf_race/race/pdf/stream"
+
+
+def fetch_pdf_info(client, dbname, value):
+    """
+    获取PDF资源目录信息
+
+    Args:
+        client: APIClient
+        dbname: 数据库名，如 mgts
+        value: 书目的资源标识
+
+    Returns:
+        list: 复本列表，每项包含 value (itemId)、name 和 pageCount
+    """
+    endpoint_def = {
+        "name": f"[PDF] 目录信息 {dbname}-{value}", "endpoint": "[PDF] 目录信息", "method": "POST",
+        "url": PDF_INFO_URL,
+        "json_data": {"dbname": dbname, "value": value, "apiKey": API_KEY}
+    }
+    success, data, status_code, error = client.make_request(endpoint_def)
+    if not success or not isinstance(data, dict) or not isinstance(data.get("data"), dict):
+        raise RuntimeError(f"获取PDF目录信息失败 (状态码: {status_code}): {error or data}")
+    return data["data"].get("items") or []
+
+
+def get_item_dir(dbname, item_id):
+    """获取分页文件的保存目录"""
+    return os.path.join(PDF_OUTPUT_DIR, sanitize_filename(f"{dbname}_{item_id}"))
+
+
+def get_page_path(item_dir, page_no):
+    """获取分页文件路径"""
+    return os.path.join(item_dir, f"page_{page_no:04d}.pdf")
+
+
+def is_page_complete(page_path):
+    """
+    检查分页是否已下载完成
+
+    分页通过临时文件加重命名写入，存在即表示完整；再检查PDF文件头，
+    排除服务端以200返回的错误信息。
+    """
+    try:
+        with open(page_path, 'rb') as f:
+            return f.read(4) == b"%PDF"
+    except OSError:
+        return False
+
+
+def fetch_page(client, dbname, item_id, page_no, page_path):
+    """
+    下载单个分页并流式写入磁盘
+
+    Returns:
+        tuple: (page_no, success, size, error)
+    """
+    endpoint_def = {
+        "name": f"[PDF] {dbname}-{item_id} 第{page_no}页", "endpoint": "[PDF] 分页", "method": "POST",
+        "url": PDF_STREAM_URL,
+        "json_data": {"dbname": dbname, "itemId": item_id, "pageNo": str(page_no), "apiKey": API_KEY},
+        "expect_json": False, "file_ext": ".pdf"
+    }
+    success, data, status_code, error = client.make_request(endpoint_def, output_path=page_path)
+    if not success:
+        return page_no, False, 0, f"状态码: {status_code}, {error}"
+    if not is_page_complete(page_path):
+        os.remove(page_path)
+        return page_no, False, 0, f"响应不是PDF (状态码: {status_code})"
+    return page_no, True, data.size, None
+
+
+def harvest_item(client, dbname, item_id, page_count, max_workers=PDF_HARVEST_WORKERS):
+    """
+    并发下载一个复本的所有分页，已下载的分页会被跳过，可中断后续传
+
+    Args:
+        client: APIClient
+        dbname: 数据库名
+        item_id: 复本标识 (itemId)
+        page_count: 总页数
+        max_workers: 同时下载的分页数
+
+    Returns:
+        tuple: (分页目录, 失败的页码列表)
+    """
+    item_dir = get_item_dir(dbname, item_id)
+    ensure_directory_exists(item_dir)
+
+    pending = [page_no for page_no in range(1, page_count + 1)
+               if not is_page_complete(get_page_path(item_dir, page_no))]
+    skipped = page_count - len(pending)
+    if skipped:
+        print(f"{Colors.INFO}已存在 {skipped} 页，继续下载剩余 {len(pending)} 页{Colors.ENDC}")
+
+    failed = []
+    total_size = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch_page, client, dbname, item_id, page_no,
+                               get_page_path(item_dir, page_no))
+                   for page_no in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            page_no, success, size, error = future.result()
+            if success:
+                total_size += size
+                print(f"[{done}/{len(pending)}] {Colors.SUCCESS}✓ 第{page_no}页 "
+                      f"({format_byte_size(size)}){Colors.ENDC}")
+            else:
+                failed.append(page_no)
+                print(f"[{done}/{len(pending)}] {Colors.FAIL}✗ 第{page_no}页: {error}{Colors.ENDC}")
+
+    print(f"{Colors.INFO}下载完成: 新增 {len(pending) - len(failed)} 页 "
+          f"({format_byte_size(total_size)}), 失败 {len(failed)} 页{Colors.ENDC}")
+    return item_dir, sorted(failed)
+
+
+def assemble_pages(item_dir, page_count, output_path):
+    """
+    按页码顺序合并分页为一个PDF文件（需要安装 pypdf）
+
+    Returns:
+        bool: 是否合并成功
+    """
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        print(f"{Colors.WARNING}未安装 pypdf，跳过合并 (pip install pypdf){Colors.ENDC}")
+        return False
+
+    writer = PdfWriter()
+    for page_no in range(1, page_count + 1):
+        writer.append(get_page_path(item_dir, page_no))
+    with atomic_open(output_path, 'wb') as f:
+        writer.write(f)
+    print(f"{Colors.SUCCESS}✓ 已合并到: {output_path}{Colors.ENDC}")
+    return True
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="根据PDF资源目录信息批量下载PDF分页")
+    parser.add_argument("--dbname", default="mgts", help="数据库名 (默认: mgts)")
+    parser.add_argument("--value", required=True, help="书目的资源标识，如 00246247")
+    parser.add_argument("--item", help="只下载指定复本 (itemId)，默认下载所有复本")
+    parser.add_argument("-j", "--workers", type=int, default=PDF_HARVEST_WORKERS,
+                        help=f"同时下载的分页数 (默认: {PDF_HARVEST_WORKERS})")
+    parser.add_argument("--assemble", action="store_true", help="下载完成后按页码合并为一个PDF")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    with APIClient() as client:
+        try:
+            items = fetch_pdf_info(client, args.dbname, args.value)
+        except RuntimeError as e:
+            print(f"{Colors.FAIL}{e}{Colors.ENDC}")
+            return
+
+        if args.item:
+            items = [item for item in items if str(item.get("value")) == args.item]
+        if not items:
+            print(f"{Colors.WARNING}没有找到可下载的复本{Colors.ENDC}")
+            return
+
+        for item in items:
+            item_id = str(item["value"])
+            page_count = int(item.get("pageCount") or 0)
+            print(f"\n{Colors.INFO}下载 {args.dbname}-{item_id} ({item.get('name')}, "
+                  f"共 {page_count} 页)...{Colors.ENDC}")
+
+            try:
+                item_dir, failed = harvest_item(client, args.dbname, item_id, page_count, args.workers)
+            except KeyboardInterrupt:
+                print(f"\n{Colors.WARNING}用户中断下载，再次运行可继续{Colors.ENDC}")
+                return
+
+            if args.assemble:
+                if failed:
+                    print(f"{Colors.WARNING}有 {len(failed)} 页未下载成功，跳过合并{Colors.ENDC}")
+                else:
+                    assemble_pages(item_dir, page_count, f"{item_dir}.pdf")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+限流模块 - 按主机的令牌桶限流
+"""
+import threading
+import time
+from config import DEFAULT_RATE_LIMIT, HOST_RATE_LIMITS
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    以 rate 个/秒的速度补充令牌，最多积累 burst 个。令牌不足时允许预支，
+    调用方按返回的等待时间排队，从而在多线程下也能保持先到先得。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        预订一个令牌
+
+        Returns:
+            float: 需要等待的秒数，0表示可以立即发送
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self):
+        """
+        尝试立即获得一个令牌，令牌不足时不预支
+
+        Returns:
+            bool: 是否获得令牌
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def release(self):
+        """归还一个取得后未使用的令牌"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """按主机管理令牌桶，参数来自 HOST_RATE_LIMITS，未配置的主机使用 DEFAULT_RATE_LIMIT"""
+
+    def __init__(self, host_limits=None, default_limit=DEFAULT_RATE_LIMIT):
+        self.host_limits = HOST_RATE_LIMITS if host_limits is None else host_limits
+        self.default_limit = default_limit
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        """获取（必要时创建）主机对应的令牌桶"""
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.host_limits.get(host, self.default_limit)
+                bucket = self._buckets[host] = TokenBucket(rate, burst)
+            return bucket
+
+    def reserve(self, host):
+        """为主机预订一个令牌，返回需要等待的秒数（供asyncio调用方使用）"""
+        return self.bucket(host).reserve()
+
+    def acquire(self, host):
+        """阻塞直到主机有可用令牌"""
+        self.bucket(host).acquire()
+
+    def try_acquire(self, host):
+        """主机有令牌时立即取得一个，不预支，也不等待"""
+        return self.bucket(host).try_acquire()
+
+    def release(self, host):
+        """归还 try_acquire() 取得后未使用的令牌"""
+        self.bucket(host).release()
+
+
+# 进程内共享的限流器，主程序和实时监控共用同一组令牌桶
+rate_limiter = RateLimiter()
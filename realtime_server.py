@@ -1,19 +1,39 @@
 """
 Real-time API monitoring server with WebSocket support
 """
+import argparse
 import asyncio
-import json
 import os
+import socket
+import sqlite3
+import subprocess
 import sys
 import logging
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any
-from flask import Flask, render_template_string, send_from_directory
-from flask_sock import Sock
+from urllib.parse import urlsplit
+from flask import Flask, render_template_string, send_from_directory, request, jsonify, Response
 import requests
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 import time
+from rate_limiter import rate_limiter
+from adaptive_concurrency import concurrency_controller
+from utils import get_host
+from http_pool import build_session, dns_cache, evict_host, collect_connection_stats
+from request_tracing import trace_request, ttfb_span, span
+from check_scheduler import CheckScheduler
+from status_store import StatusStore
+from ws_hub import WebSocketHub
+from shared_state import SharedStateWriter, SharedStateReader
+from status_history import StatusHistory
+from timeseries import TimeSeriesStore, TIERS, parse_duration
+from metrics import ProbeMetrics, metric_lines, CONTENT_TYPE
+from adaptive_timeout import AdaptiveTimeouts
+from retry_policy import retry_policy
+from circuit_breaker import CircuitBreakers, is_breaker_failure, CLOSED
+from werkzeug.serving import make_server
 
 # Handle Windows console encoding
 if sys.platform == 'win32':
@@ -26,20 +46,64 @@ logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
-sock = Sock(app)
 
 # Configuration
 API_KEY = os.environ.get('SHANGHAI_LIBRARY_API_KEY', 'YOUR_API_KEY_HERE')
 BASE_URL = 'https://data.library.sh.cn/api'
-CHECK_INTERVAL = 30  # seconds between API checks
-MAX_CONCURRENT_CHECKS = 5
+CHECK_INTERVAL = 30  # base seconds between checks of one endpoint
+MIN_CHECK_INTERVAL = 10  # failing or flapping endpoints
+MAX_CHECK_INTERVAL = 300  # healthy endpoints back off up to this
+CHECK_BACKOFF = 1.5  # interval multiplier after each stable healthy check
+CHECK_JITTER = 0.2  # +/- fraction of randomness added to every interval
+BROADCAST_INTERVAL = 1.0  # seconds between status broadcasts while checks complete
+WS_PORT = 5001  # WebSocket hub port, served separately from the Flask app
+WS_QUEUE_SIZE = 64  # messages queued per client before its backlog is coalesced into a full resync
+WS_MAX_LAG = 30  # seconds a client may keep overflowing its queue before it is disconnected
+MAX_CONCURRENT_CHECKS = 10
+PROBE_BYTE_BUDGET = 16 * 1024  # stop reading a probe's body after this many bytes (0 downloads everything)
+PROBE_HEAD_SIZE = 1024  # leading bytes kept for the structural check and error messages
+PROBE_TIMEOUT = 10  # longest probe timeout; each endpoint's own is its p99 x TIMEOUT_P99_FACTOR (config.py), clamped
+PROBE_TIMEOUT_FILE = 'cache/realtime_timeouts.json'  # latency samples behind the per-endpoint timeouts
+CIRCUIT_RESET_TIMEOUT = 60  # seconds an open host/endpoint circuit fails fast before one trial probe goes through
+PORT = 5000  # HTTP port
+SHARED_STATE_DB = 'cache/realtime_state.db'  # state shared by the producer and workers in serve mode
+SHARED_STATE_POLL_INTERVAL = 0.5  # seconds between worker polls of the shared state
+STATUS_FILE = 'cache/realtime_status.json'  # latest results and recent history, reloaded as stale on restart
+STATUS_SAVE_INTERVAL = 10  # seconds between write-behind saves of STATUS_FILE
+STATUS_HISTORY_SIZE = 50  # checks of history kept per endpoint
+TIMESERIES_DB = 'cache/timeseries.db'  # 1 min / 1 h / 1 day rollups of every check, saved with STATUS_FILE
+TIMESERIES_RAW_SIZE = 500  # most recent checks per endpoint kept in memory for exact percentiles
 
 # Global state
-api_status: Dict[str, Dict[str, Any]] = {}
+status_store = StatusStore()
 initial_check_complete = False
 monitoring_active = Event()
 monitoring_active.set()
-connected_clients = set()
+last_broadcast_seq = 0
+last_broadcast_loading = True
+last_broadcast_circuits = 0
+scheduler = CheckScheduler(CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL,
+                           backoff=CHECK_BACKOFF, jitter=CHECK_JITTER)
+
+# Keep-alive session shared by all probes, created by get_probe_session()
+probe_session = None
+# Set in serve mode: the producer writes the shared state, workers read it
+shared_writer = None
+shared_reader = None
+probe_session_lock = Lock()
+# Write-behind copy of the latest results and history, saved by the monitoring loop
+status_history = StatusHistory(STATUS_FILE, STATUS_HISTORY_SIZE)
+# Every check, rolled up for range queries; workers read the producer's rollups
+timeseries = TimeSeriesStore(TIMESERIES_DB, raw_size=TIMESERIES_RAW_SIZE)
+# Prometheus histograms and counters, updated once per probe
+probe_metrics = ProbeMetrics()
+# Per-endpoint timeouts learned from each endpoint's own latency
+probe_timeouts = AdaptiveTimeouts(ceiling=PROBE_TIMEOUT, path=PROBE_TIMEOUT_FILE)
+# Per-host and per-endpoint circuit breakers, tripped by consecutive connection errors, timeouts and 5xx
+probe_circuits = CircuitBreakers(reset_timeout=CIRCUIT_RESET_TIMEOUT)
+
+# Probes use blocking requests sessions, so they run on this pool while the event loop schedules them
+check_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHECKS, thread_name_prefix='api-check')
 
 
 def format_size(size_bytes):
@@ -69,10 +133,17 @@ def load_api_definitions():
         # This ensures the API_KEY is available when api_lists.py is executed
         api_lists.API_KEY = API_KEY
 
-        # Also inject into sys.modules so config.py can use it
+        # Temporarily inject into sys.modules so config.py can use it,
+        # restoring the real config module for the rest of the process
+        real_config = sys.modules.get('config')
         sys.modules['config'] = type('obj', (object,), {'API_KEY': API_KEY})
-
-        spec.loader.exec_module(api_lists)
+        try:
+            spec.loader.exec_module(api_lists)
+        finally:
+            if real_config is not None:
+                sys.modules['config'] = real_config
+            else:
+                del sys.modules['config']
 
         # Verify API_KEY was set correctly
         if hasattr(api_lists, 'API_KEY') and api_lists.API_KEY:
@@ -95,12 +166,115 @@ def get_category_from_filename(filename):
     return '其他'
 
 
+def get_api_host(api_def: Dict[str, Any]) -> str:
+    """Return the host an API definition is served from"""
+    url = api_def.get('url', '')
+    return get_host(url if url.startswith('http') else BASE_URL + url)
+
+
+def get_probe_session() -> requests.Session:
+    """Return the pooled keep-alive session shared by all probes, creating it on first use"""
+    global probe_session
+    with probe_session_lock:
+        if probe_session is None:
+            dns_cache.install()
+            probe_session = build_session(default_pool_size=MAX_CONCURRENT_CHECKS)
+        return probe_session
+
+
+def warm_up_connections(apis: List[Dict[str, Any]]):
+    """Open one pooled connection per host so the first sweep does not pay for the handshakes"""
+    session = get_probe_session()
+    roots = {}
+    for api in apis:
+        parts = urlsplit(api['url'] if api['url'].startswith('http') else BASE_URL + api['url'])
+        roots.setdefault(parts.netloc.lower(), f"{parts.scheme}://{parts.netloc}/")
+    for host, root in roots.items():
+        try:
+            session.head(root, timeout=10).close()
+            logger.info(f"Warmed up connection to {host}")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Warm-up failed for {host}: {e}")
+            evict_host(session, host)
+
+
+def send_probe(session, api_def: Dict[str, Any], method: str, full_url: str, headers: Dict[str, str],
+               timeout: float = PROBE_TIMEOUT):
+    """Send the probe request, filling in the API key where the definition left it empty"""
+    if method.upper() == 'GET':
+        # Use params for GET requests
+        params = api_def.get('params', {}).copy() if api_def.get('params') else {}
+
+        # Fix empty key in params
+        if 'key' in params and params['key'] in ['', None]:
+            params['key'] = API_KEY
+
+        return session.get(full_url, headers=headers, params=params, timeout=timeout, stream=True)
+
+    # Use json_data for POST requests
+    json_data = api_def.get('json_data', {})
+    # Replace apiKey in json_data if present
+    if json_data and isinstance(json_data, dict):
+        json_data_copy = json_data.copy()
+        if 'apiKey' in json_data_copy and json_data_copy['apiKey'] in ['', None]:
+            json_data_copy['apiKey'] = API_KEY
+    else:
+        json_data_copy = json_data
+    return session.post(full_url, headers=headers, json=json_data_copy, timeout=timeout, stream=True)
+
+
+def looks_like_json(head: bytes) -> bool:
+    """Structural check on the first bytes of a JSON body: it must open an object or array"""
+    return head.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] in (b'{', b'[')
+
+
+def read_probe_body(response, byte_budget: int = PROBE_BYTE_BUDGET):
+    """Stream the body only as far as the probe needs it.
+
+    Reading stops at EOF, after byte_budget bytes, or - when Content-Length already says the
+    body is larger than the budget - as soon as the structural check has passed. Bodies within
+    the budget are read to the end so the connection goes back to the pool.
+
+    Returns:
+        (head, received, size, exact): the first PROBE_HEAD_SIZE bytes, the bytes actually read,
+        the body size taken from Content-Length or the bytes counted, and whether that size is exact
+    """
+    declared = None
+    if response.headers.get('Content-Encoding', 'identity') == 'identity':
+        try:
+            declared = int(response.headers['Content-Length'])
+        except (KeyError, ValueError):
+            pass
+    is_json = 'json' in response.headers.get('Content-Type', '')
+    stop_early = bool(byte_budget) and declared is not None and declared > byte_budget
+
+    head = b''
+    received = 0
+    finished = True
+    for chunk in response.iter_content(chunk_size=8192):
+        received += len(chunk)
+        if len(head) < PROBE_HEAD_SIZE:
+            head += chunk[:PROBE_HEAD_SIZE - len(head)]
+        if stop_early and len(head) >= min(PROBE_HEAD_SIZE, declared) and (not is_json or looks_like_json(head)):
+            finished = False
+            break
+        if byte_budget and received >= byte_budget:
+            finished = False
+            break
+    if not finished:
+        # Unread bytes are left on the socket, so urllib3 discards this connection
+        response.close()
+    if finished:
+        return head, received, received, True
+    return head, received, declared if declared is not None else received, declared is not None
+
+
 def check_single_api(api_def: Dict[str, Any]) -> Dict[str, Any]:
     """Check a single API endpoint and return status"""
     api_name = api_def.get('name', 'Unknown')
     method = api_def.get('method', 'GET')
     url = api_def.get('url', '')
-    category = api_def.get('category', '其他')
+    category = api_def.get('category') or get_category_from_filename(api_name)
 
     result = {
         'name': api_name,
@@ -114,162 +288,470 @@ def check_single_api(api_def: Dict[str, Any]) -> Dict[str, Any]:
         'error': None
     }
 
-    try:
-        # Process URL - replace {API_KEY} placeholder if present
-        full_url = BASE_URL + url if not url.startswith('http') else url
-
-        # Replace {API_KEY} placeholder in URL
-        if '{API_KEY}' in full_url:
-            full_url = full_url.replace('{API_KEY}', API_KEY)
-
-        # Fix URLs that have empty key parameter (key= or key=&)
-        # This happens when API_KEY was empty when api_lists.py was loaded
-        if '?key=' in full_url or '&key=' in full_url:
-            import re
-            # Replace ?key= or &key= (when followed by & or end of string)
-            # Only replace if empty (key=& or key= at end)
-            full_url = re.sub(r'([?&])key=(&|$)', r'\1key=' + API_KEY + r'\2', full_url)
-
-        headers = {
-            'Accept': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+    timeout = result['timeout'] = probe_timeouts.timeout(api_name)
+    with trace_request(api_name, url) as trace:
+        try:
+            # Process URL - replace {API_KEY} placeholder if present
+            full_url = BASE_URL + url if not url.startswith('http') else url
+
+            # Replace {API_KEY} placeholder in URL
+            if '{API_KEY}' in full_url:
+                full_url = full_url.replace('{API_KEY}', API_KEY)
+
+            # Fix URLs that have empty key parameter (key= or key=&)
+            # This happens when API_KEY was empty when api_lists.py was loaded
+            if '?key=' in full_url or '&key=' in full_url:
+                import re
+                # Replace ?key= or &key= (when followed by & or end of string)
+                # Only replace if empty (key=& or key= at end)
+                full_url = re.sub(r'([?&])key=(&|$)', r'\1key=' + API_KEY + r'\2', full_url)
+
+            headers = {
+                'Accept': 'application/json',
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            }
+
+            session = get_probe_session()
+            start_time = time.perf_counter()
+            # A connection that fails or times out is discarded by urllib3; the host's other
+            # pooled connections stay in the pool
+            with ttfb_span():
+                response = send_probe(session, api_def, method, full_url, headers, timeout)
+            result['ttfb'] = round((time.perf_counter() - start_time) * 1000, 2)
+            with span('download'):
+                head, received, size, exact = read_probe_body(response)
+
+            result['response_time'] = round((time.perf_counter() - start_time) * 1000, 2)
+            result['status_code'] = response.status_code
+            # Size comes from Content-Length or the byte count, never from re-encoding the body
+            result['bytes_read'] = received
+            result['size'] = size
+            result['size_formatted'] = format_size(size) if exact else f"≥{format_size(size)}"
+
+            if response.status_code == 200:
+                if 'json' in response.headers.get('Content-Type', '') and head and not looks_like_json(head):
+                    result['status'] = 'error'
+                    result['error'] = f"Invalid JSON body: {head[:200].decode('utf-8', 'replace')}"
+                else:
+                    result['status'] = 'success'
+            else:
+                result['status'] = 'error'
+                # Include response body for debugging
+                try:
+                    response_text = head[:200].decode(response.encoding or 'utf-8', 'replace')
+                    result['error'] = f"HTTP {response.status_code}: {response_text}"
+                except:
+                    result['error'] = f"HTTP {response.status_code}"
+
+        except requests.exceptions.Timeout:
+            result['status'] = 'timeout'
+            result['error'] = f'Request timeout (>{timeout:g}s)'
+        except requests.exceptions.ConnectionError as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+            result['connection_error'] = True
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
 
-        start_time = time.time()
-        if method.upper() == 'GET':
-            # Use params for GET requests
-            params = api_def.get('params', {}).copy() if api_def.get('params') else {}
+    result['timing'] = trace.summary()
+    return result
 
-            # Fix empty key in params
-            if 'key' in params and params['key'] in ['', None]:
-                params['key'] = API_KEY
 
-            response = requests.get(full_url, headers=headers, params=params, timeout=10)
-        else:
-            # Use json_data for POST requests
-            json_data = api_def.get('json_data', {})
-            # Replace apiKey in json_data if present
-            if json_data and isinstance(json_data, dict):
-                json_data_copy = json_data.copy()
-                if 'apiKey' in json_data_copy and json_data_copy['apiKey'] in ['', None]:
-                    json_data_copy['apiKey'] = API_KEY
+def circuit_open_result(api_def: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    """Fail-fast result for an endpoint whose host or own circuit is open; no request is sent"""
+    api_name = api_def.get('name', 'Unknown')
+    return {
+        'name': api_name,
+        'category': api_def.get('category') or get_category_from_filename(api_name),
+        'url': api_def.get('url', ''),
+        'method': api_def.get('method', 'GET'),
+        'status': 'error',
+        'response_time': 0,
+        'size': 0,
+        'timestamp': datetime.now().isoformat(),
+        'error': reason,
+        'circuit_open': True
+    }
+
+
+class HostSlots:
+    """Per-host in-flight counter bounded by the host's adaptive concurrency window"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, int] = {}
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, host: str):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: self._in_flight.get(host, 0) < concurrency_controller.limit(host))
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+
+    def try_acquire(self, host: str) -> bool:
+        """Take a slot only if one is free right now (the event loop is single-threaded, so no lock)"""
+        if self._in_flight.get(host, 0) >= concurrency_controller.limit(host):
+            return False
+        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        return True
+
+    async def release(self, host: str):
+        async with self._changed:
+            self._in_flight[host] -= 1
+            self._changed.notify_all()
+
+
+def record_probe_timing(api_name: str, result: Dict[str, Any]):
+    """Feed the time to response headers, or the timeout that expired, into the endpoint's adaptive timeout"""
+    if result['status'] == 'timeout':
+        probe_timeouts.record_timeout(api_name, result['timeout'])
+    elif result.get('ttfb') is not None:
+        probe_timeouts.record(api_name, result['ttfb'] / 1000)
+
+
+async def run_probe(api: Dict[str, Any], host: str, key: str, semaphore: asyncio.Semaphore,
+                    slots: HostSlots) -> Dict[str, Any]:
+    """Run check_single_api on the pool while holding a host slot and a global slot, both already taken
+    by the caller and released when the probe finishes. The probe's outcome is recorded with the
+    circuit breakers before its slots are released, so the checks waiting for them see it.
+    With hedging on, a probe still running after the endpoint's p95 gets a duplicate, but only if a host
+    slot, a global slot and a rate-limit token are free right away; the duplicate holds its own slots
+    until it finishes, even when it loses. The first successful result wins, and only the winner's
+    timing feeds the endpoint's adaptive timeout."""
+    loop = asyncio.get_running_loop()
+
+    async def probe(admitted=False):
+        try:
+            result = await loop.run_in_executor(check_executor, check_single_api, api)
+            if admitted:
+                # Only the probe the breakers admitted is recorded, not its hedge
+                probe_circuits.record(host, key, is_breaker_failure(result.get('status_code')))
+            return result
+        finally:
+            semaphore.release()
+            await slots.release(host)
+
+    first = asyncio.ensure_future(probe(admitted=True))
+    winner = first
+    delay = retry_policy.hedge_delay(api, probe_timeouts)
+    if delay is not None:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if not done and not semaphore.locked() and slots.try_acquire(host):
+            hedging = rate_limiter.try_acquire(host)
+            if hedging and not retry_policy.start_hedge(host):
+                # Out of budget: the token goes back to the host's regular probes
+                rate_limiter.release(host)
+                hedging = False
+            if hedging:
+                # Not locked, so this returns without yielding
+                await semaphore.acquire()
+                hedge = asyncio.ensure_future(probe())
+                pending = {first, hedge}
+                winner = None
+                while winner is None and pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((future for future in done if future.result()['status'] == 'success'), None)
+                if winner is None:
+                    winner = first
+                elif winner is hedge:
+                    retry_policy.record_hedge_win()
             else:
-                json_data_copy = json_data
-            response = requests.post(full_url, headers=headers, json=json_data_copy, timeout=10)
-
-        result['response_time'] = round((time.time() - start_time) * 1000, 2)
-        result['status_code'] = response.status_code
-
-        if response.status_code == 200:
-            result['status'] = 'success'
-            try:
-                data = response.json()
-                result['size'] = len(json.dumps(data))
-                result['size_formatted'] = format_size(result['size'])
-            except:
-                result['size'] = len(response.content)
-                result['size_formatted'] = format_size(result['size'])
-        else:
-            result['status'] = 'error'
-            # Include response body for debugging
-            try:
-                response_text = response.text[:200]
-                result['error'] = f"HTTP {response.status_code}: {response_text}"
-            except:
-                result['error'] = f"HTTP {response.status_code}"
-
-    except requests.exceptions.Timeout:
-        result['status'] = 'timeout'
-        result['error'] = 'Request timeout (>10s)'
-    except Exception as e:
-        result['status'] = 'error'
-        result['error'] = str(e)
+                await slots.release(host)
 
+    result = await winner
+    record_probe_timing(api.get('name', 'Unknown'), result)
+    return result
+
+
+async def check_api(api: Dict[str, Any], semaphore: asyncio.Semaphore, slots: HostSlots,
+                    due: float = None) -> Dict[str, Any]:
+    """Check one API once a host slot, a rate-limit token and a global slot are available.
+    due is the scheduler's (monotonic) due time, used to measure how late the probe starts.
+    Connection errors, timeouts and retryable status codes are retried with backoff, within
+    the host's retry budget, before the result is published. While the host's or the endpoint's
+    circuit is open the check fails fast without sending anything; a retry whose circuit has opened
+    in the meantime is dropped and the last failure is published."""
+    host = get_api_host(api)
+    api_name = api.get('name', 'Unknown')
+    key = f"{api.get('category') or get_category_from_filename(api_name)}::{api_name}"
+    await slots.acquire(host)
+    # Asked only once a host slot is free, and every probe is recorded before its slot is released;
+    # the breakers also count probes still in flight, so a dead host gets at most threshold probes
+    rejected = probe_circuits.allow(host, key)
+    if rejected:
+        await slots.release(host)
+        result = circuit_open_result(api, rejected)
+        status_store.update(key, result)
+        return result
+
+    retry_policy.record_request(host)
+    attempt = 0
+    while True:
+        try:
+            # Wait for the host's rate limiter instead of a fixed delay
+            wait = rate_limiter.reserve(host)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await semaphore.acquire()
+        except BaseException:
+            await slots.release(host)
+            raise
+        if due is not None and attempt == 0:
+            probe_metrics.observe_lag(time.monotonic() - due)
+        # run_probe releases both slots as soon as its probe finishes
+        result = await run_probe(api, host, key, semaphore, slots)
+
+        concurrency_controller.record(host, result['response_time'] / 1000,
+                                      result.get('status_code'), result['status'] == 'timeout')
+        # Only timeouts, connection errors and retryable status codes are worth another attempt
+        error = result['error'] if result['status'] == 'timeout' or result.get('connection_error') else None
+        if (result['status'] == 'success'
+                or not retry_policy.is_transient(result.get('status_code'), error)
+                or not retry_policy.should_retry(api, host, attempt)):
+            break
+        # Back off without holding any slot
+        await asyncio.sleep(retry_policy.backoff(attempt))
+        await slots.acquire(host)
+        # Failures recorded meanwhile (by this check or others) may have opened the circuit
+        if probe_circuits.allow(host, key):
+            await slots.release(host)
+            break
+        attempt += 1
+
+    result['attempts'] = attempt + 1
+    # Update global state as soon as this check completes
+    status_store.update(key, result)
     return result
 
 
 async def check_apis_batch(apis: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Check multiple APIs in batches"""
-    results = []
-    for i in range(0, len(apis), MAX_CONCURRENT_CHECKS):
-        batch = apis[i:i + MAX_CONCURRENT_CHECKS]
-        for api in batch:
-            result = check_single_api(api)
-            results.append(result)
-            # Update global state
-            key = f"{result['category']}::{result['name']}"
-            api_status[key] = result
-            # Add delay between individual requests to avoid rate limiting
-            await asyncio.sleep(0.5)
-        # Delay between batches
-        if i + MAX_CONCURRENT_CHECKS < len(apis):
-            await asyncio.sleep(2)
-    return results
+    """Check APIs concurrently, at most MAX_CONCURRENT_CHECKS at once and within each host's window"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHECKS)
+    slots = HostSlots()
+    return list(await asyncio.gather(*(check_api(api, semaphore, slots) for api in apis)))
 
 
-def broadcast_status():
-    """Broadcast status to all connected WebSocket clients"""
-    if not connected_clients:
-        return
+def build_initial_message(snapshot) -> Dict[str, Any]:
+    """Full state message sent to new clients and to clients that cannot be caught up with deltas"""
+    return {
+        'type': 'initial',
+        'timestamp': datetime.now().isoformat(),
+        'epoch': status_store.epoch,
+        'seq': snapshot.seq,
+        'total_apis': snapshot.summary['total_apis'],
+        'success_count': snapshot.summary['success_count'],
+        'error_count': snapshot.summary['error_count'],
+        'apis': snapshot.apis,
+        'circuits': circuit_data(),
+        'loading': not initial_check_complete
+    }
+
 
-    # Prepare summary data
-    summary = {
-        'type': 'status_update',
+def build_delta_message(snapshot, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Message carrying only the endpoints whose status, latency bucket or size changed"""
+    return {
+        'type': 'delta',
         'timestamp': datetime.now().isoformat(),
-        'total_apis': len(api_status),
-        'success_count': sum(1 for s in api_status.values() if s['status'] == 'success'),
-        'error_count': sum(1 for s in api_status.values() if s['status'] in ['error', 'timeout']),
-        'categories': {}
+        'epoch': status_store.epoch,
+        'seq': snapshot.seq,
+        **snapshot.summary,
+        'changes': changes,
+        'circuits': circuit_data(),
+        'loading': not initial_check_complete
     }
 
-    # Count by category
-    for status in api_status.values():
-        cat = status['category']
-        if cat not in summary['categories']:
-            summary['categories'][cat] = {'total': 0, 'success': 0, 'error': 0}
-        summary['categories'][cat]['total'] += 1
-        if status['status'] == 'success':
-            summary['categories'][cat]['success'] += 1
-        else:
-            summary['categories'][cat]['error'] += 1
 
-    # Send to all clients
-    message = json.dumps(summary)
-    for client in list(connected_clients):
-        try:
-            client.send(message)
-        except:
-            connected_clients.remove(client)
+def build_sync_message(last_seq=None, epoch=None) -> Dict[str, Any]:
+    """Catch a client up from its last seen sequence, falling back to the full state"""
+    if last_seq is None:
+        return build_initial_message(status_store.snapshot)
+    snapshot, changes = status_store.changes_since(last_seq, epoch)
+    if changes is None:
+        return build_initial_message(snapshot)
+    return build_delta_message(snapshot, changes)
+
+
+def broadcast_status():
+    """Broadcast the endpoints that changed since the last broadcast to all connected WebSocket clients"""
+    global last_broadcast_seq, last_broadcast_loading, last_broadcast_circuits
+    snapshot, changes = status_store.changes_since(last_broadcast_seq)
+    loading = not initial_check_complete
+    # A breaker opening, going half-open or closing is pushed even when no endpoint result changed
+    circuits = circuit_data()['version']
+    if (not changes and changes is not None and loading == last_broadcast_loading
+            and circuits == last_broadcast_circuits):
+        last_broadcast_seq = snapshot.seq
+        return
+    last_broadcast_seq = snapshot.seq
+    last_broadcast_loading = loading
+    last_broadcast_circuits = circuits
+    if not ws_hub.clients:
+        return
+
+    if changes is None:
+        update = build_initial_message(snapshot)
+    else:
+        update = build_delta_message(snapshot, changes)
+
+    # Encoded once and queued for every client by the hub, never blocking the monitor
+    ws_hub.publish(update)
+
+
+async def run_scheduled_check(api: Dict[str, Any], semaphore: asyncio.Semaphore, slots: HostSlots,
+                              due: float = None):
+    """Check one due endpoint and hand the outcome back to the scheduler"""
+    try:
+        result = await check_api(api, semaphore, slots, due)
+        healthy = result['status'] == 'success'
+    except Exception as e:
+        logger.error(f"Error checking {api.get('name')}: {e}")
+        healthy = False
+    scheduler.record(api['name'], healthy)
 
 
 async def monitoring_loop():
-    """Background loop to continuously monitor APIs"""
+    """Background loop that checks each endpoint when the scheduler says it is due"""
     logger.info("Starting real-time monitoring loop...")
     apis = load_api_definitions()
     logger.info(f"Loaded {len(apis)} API definitions for monitoring")
+    restore_status(apis)
+    await asyncio.get_running_loop().run_in_executor(check_executor, warm_up_connections, apis)
 
     global initial_check_complete
 
+    # Spread the first checks over one interval so the endpoints don't all fire (and stay in lockstep) at startup
+    for i, api in enumerate(apis):
+        scheduler.add(api['name'], api, delay=i * CHECK_INTERVAL / len(apis))
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHECKS)
+    slots = HostSlots()
+    pending_initial = {api['name'] for api in apis}
+    in_flight = set()
+    last_broadcast = 0.0
+    last_save = time.monotonic()
+
     while monitoring_active.is_set():
         try:
-            logger.info("Checking API status...")
-            results = await check_apis_batch(apis)
-            logger.info(f"Checked {len(results)} APIs: "
-                       f"{sum(1 for r in results if r['status'] == 'success')} success, "
-                       f"{sum(1 for r in results if r['status'] in ['error', 'timeout'])} failed")
-
-            # Mark initial check as complete
-            initial_check_complete = True
-            logger.info("Initial API check complete. Data ready for clients.")
-
-            # Broadcast to connected clients
-            broadcast_status()
+            for entry in scheduler.pop_due():
+                task = asyncio.create_task(run_scheduled_check(entry.payload, semaphore, slots, entry.next_due))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                task.add_done_callback(lambda _, name=entry.key: pending_initial.discard(name))
+
+            if pending_initial == set() and not initial_check_complete:
+                # Mark initial check as complete
+                initial_check_complete = True
+                logger.info(f"Initial API check complete: "
+                            f"{status_store.snapshot.summary['success_count']}/{len(status_store)} success. "
+                            f"Data ready for clients.")
+
+            # Broadcast to connected clients at most once per BROADCAST_INTERVAL
+            if time.monotonic() - last_broadcast >= BROADCAST_INTERVAL:
+                broadcast_status()
+                if shared_writer is not None:
+                    publish_shared_state()
+                last_broadcast = time.monotonic()
+
+            # Write-behind: save off the event loop, never on the probe path
+            if time.monotonic() - last_save >= STATUS_SAVE_INTERVAL:
+                asyncio.get_running_loop().run_in_executor(None, save_status)
+                last_save = time.monotonic()
 
         except Exception as e:
             logger.error(f"Error in monitoring loop: {e}")
 
-        # Wait for next check
-        await asyncio.sleep(CHECK_INTERVAL)
+        # Sleep until the next endpoint is due, waking up regularly to broadcast
+        wait = scheduler.seconds_until_next()
+        await asyncio.sleep(BROADCAST_INTERVAL if wait is None else min(wait, BROADCAST_INTERVAL))
+
+
+def restore_status(apis: List[Dict[str, Any]]):
+    """Load the results saved by the previous run as stale entries, so clients have data
+    immediately; each one is replaced when its endpoint is checked again"""
+    names = {api['name'] for api in apis}
+    saved = status_history.load()
+    restored = [(key, {**result, 'stale': True}, None, True)
+                for key, result in saved.items() if result.get('name') in names]
+    if restored:
+        status_store.update_many(restored)
+        logger.info(f"Restored {len(restored)} stale results from {STATUS_FILE}")
+    status_store.add_listener(status_history.record)
+    try:
+        logger.info(f"Loaded {timeseries.load()} time-series buckets from {TIMESERIES_DB}")
+    except sqlite3.Error as e:
+        logger.error(f"Error loading {TIMESERIES_DB}: {e}")
+    status_store.add_listener(timeseries.record)
+    status_store.add_listener(probe_metrics.record)
+
+
+def save_status():
+    """Save the latest results, history and time-series buckets that changed since the last save"""
+    try:
+        status_history.save_if_dirty()
+    except OSError as e:
+        logger.error(f"Error saving {STATUS_FILE}: {e}")
+    try:
+        timeseries.flush()
+    except sqlite3.Error as e:
+        logger.error(f"Error saving {TIMESERIES_DB}: {e}")
+    try:
+        probe_timeouts.save()
+    except OSError as e:
+        logger.error(f"Error saving {PROBE_TIMEOUT_FILE}: {e}")
+
+
+def render_probe_metrics() -> str:
+    """Producer-side Prometheus text: probe histograms and counters, retry and hedging counters
+    and circuit breaker state"""
+    retries = retry_policy.stats()
+    lines = metric_lines('api_monitor_retries_total', 'counter',
+                         'Probes retried after a connection error, timeout or retryable status.',
+                         [((), retries['retries'])])
+    lines += metric_lines('api_monitor_retry_budget_exhausted_total', 'counter',
+                          'Retries and hedges skipped because the host retry budget was spent.',
+                          [((), retries['exhausted'])])
+    lines += metric_lines('api_monitor_hedges_total', 'counter',
+                          'Duplicate probes sent after a probe outlasted its endpoint p95.',
+                          [((), retries['hedges'])])
+    lines += metric_lines('api_monitor_hedge_wins_total', 'counter',
+                          'Hedged probes that returned before the original.', [((), retries['hedge_wins'])])
+    circuits = probe_circuits.snapshot()
+    lines += metric_lines('api_monitor_circuit_open', 'gauge',
+                          'Whether the host circuit is open or half-open (1) or closed (0).',
+                          [((('host', host),), int(breaker['state'] != CLOSED))
+                           for host, breaker in circuits['hosts'].items()])
+    lines += metric_lines('api_monitor_circuit_open_endpoints', 'gauge',
+                          'Endpoints whose own circuit is open or half-open.', [((), len(circuits['endpoints']))])
+    lines += metric_lines('api_monitor_circuit_rejected_total', 'counter',
+                          'Checks failed fast because a circuit was open.', [((), circuits['rejected'])])
+    return probe_metrics.render() + '\n'.join(lines) + '\n'
+
+
+def publish_shared_state():
+    """Producer side: write the latest results and the producer-only views for the workers"""
+    shared_writer.flush(status_store.seq, loading=not initial_check_complete,
+                        schedule=scheduler.snapshot(), concurrency=concurrency_data(),
+                        metrics=render_probe_metrics(), timeouts=probe_timeouts.snapshot(),
+                        circuits=probe_circuits.snapshot())
+
+
+def follow_shared_state():
+    """Worker side: apply the producer's writes to the local store and push them to this worker's clients"""
+    global status_store, initial_check_complete, last_broadcast_seq
+    while monitoring_active.is_set():
+        try:
+            epoch, _, rows = shared_reader.changes(status_store.seq)
+            if epoch is not None and epoch != status_store.epoch:
+                # The producer (re)started: rebuild from its current state under its epoch
+                epoch, _, rows = shared_reader.changes(0)
+                status_store = StatusStore(epoch=epoch)
+                last_broadcast_seq = 0
+            if rows:
+                status_store.update_many(rows)
+            initial_check_complete = not shared_reader.meta('loading', True)
+            broadcast_status()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading shared state: {e}")
+        time.sleep(SHARED_STATE_POLL_INTERVAL)
 
 
 def run_monitoring_in_thread():
@@ -291,152 +773,303 @@ def index():
     return send_from_directory('web_dashboard', 'realtime_index.html')
 
 
+def snapshot_response(snapshot, build_payload):
+    """Answer with 304 when the client already has this snapshot, otherwise with the payload and its ETag"""
+    # Breaker transitions change the payload without a new status sequence number
+    etag = f"{status_store.epoch}-{snapshot.seq}-{circuit_data()['version']}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    return response
+
+
 @app.route('/data/stats.json')
 def get_stats():
     """Serve current statistics as JSON"""
-    # Calculate summary
-    success_count = sum(1 for s in api_status.values() if s['status'] == 'success')
-    error_count = sum(1 for s in api_status.values() if s['status'] in ['error', 'timeout'])
-
-    categories = {}
-    for status in api_status.values():
-        cat = status['category']
-        if cat not in categories:
-            categories[cat] = {'count': 0, 'totalSize': 0, 'success': 0, 'error': 0}
-        categories[cat]['count'] += 1
-        categories[cat]['totalSize'] += status.get('size', 0)
-        if status['status'] == 'success':
-            categories[cat]['success'] += 1
-        else:
-            categories[cat]['error'] += 1
-
-    data = {
+    snapshot = status_store.snapshot
+    return snapshot_response(snapshot, lambda: {
         'stats': {
-            'totalApis': len(api_status),
-            'successCount': success_count,
-            'errorCount': error_count,
-            'successRate': round(success_count / len(api_status) * 100, 1) if api_status else 0,
-            'categoryCount': len(categories),
-            'totalSize': format_size(sum(s.get('size', 0) for s in api_status.values())),
-            'fileCount': success_count,
-            'lastUpdate': datetime.now().isoformat()
+            **snapshot.stats,
+            'totalSize': format_size(snapshot.stats['totalSize']),
+            'lastUpdate': snapshot.published_at
         },
-        'categories': categories,
-        'apis': list(api_status.values()),
+        'categories': snapshot.categories,
+        'apis': snapshot.apis,
+        'seq': snapshot.seq,
+        'circuits': circuit_data(),
         'realtime': True
-    }
-    return data
+    })
 
 
 @app.route('/data/apis')
 def get_apis():
     """Get all API statuses"""
-    return {'apis': list(api_status.values())}
+    snapshot = status_store.snapshot
+    return snapshot_response(snapshot, lambda: {'apis': snapshot.apis, 'seq': snapshot.seq})
 
 
-@sock.route('/ws')
-def websocket_connection(ws):
-    """Handle WebSocket connections"""
-    global initial_check_complete, api_status
+def concurrency_data() -> Dict[str, Any]:
+    """Adaptive concurrency window and pooled connection counts per host"""
+    connections = collect_connection_stats(probe_session) if probe_session is not None else {}
+    return {'hosts': concurrency_controller.snapshot(), 'connections': connections}
 
-    connected_clients.add(ws)
-    logger.info(f"Client connected. Total clients: {len(connected_clients)}")
 
-    # Send initial status immediately (even if still loading)
-    try:
-        success_count = sum(1 for s in api_status.values() if s['status'] == 'success')
-        error_count = sum(1 for s in api_status.values() if s['status'] in ['error', 'timeout'])
+def circuit_data() -> Dict[str, Any]:
+    """Circuit breaker state: every host, plus the endpoints whose own circuit is not closed"""
+    if shared_reader is not None:
+        return shared_reader.meta('circuits', {'hosts': {}, 'endpoints': {}, 'rejected': 0, 'version': 0})
+    return probe_circuits.snapshot()
 
-        initial_data = {
-            'type': 'initial',
+
+@app.route('/data/concurrency')
+def get_concurrency():
+    """Get the current adaptive concurrency window and pooled connection counts per host"""
+    if shared_reader is not None:
+        return shared_reader.meta('concurrency', {'hosts': {}, 'connections': {}})
+    return concurrency_data()
+
+
+@app.route('/data/schedule')
+def get_schedule():
+    """Get each endpoint's current check interval and time until its next check"""
+    if shared_reader is not None:
+        return {'endpoints': shared_reader.meta('schedule', {})}
+    return {'endpoints': scheduler.snapshot()}
+
+
+@app.route('/data/history/<path:key>')
+def get_history(key: str):
+    """Get the recent checks of one endpoint (key is "category::name"), oldest first"""
+    if shared_reader is not None:
+        # Workers read the producer's last save
+        status_history.reload_if_changed()
+    return {'key': key, 'history': status_history.history(key)}
+
+
+@app.route('/data/timeseries')
+def get_timeseries_keys():
+    """List the endpoints with time-series data and the rollup tiers"""
+    return {'keys': timeseries.keys(),
+            'tiers': [{'name': name, 'width': width, 'retention': retention} for name, width, retention in TIERS]}
+
+
+@app.route('/data/timeseries/<path:key>')
+def get_timeseries(key: str):
+    """Availability, latency percentiles and size of one endpoint over a time range.
+    Query: range=15m|24h|7d (default 1h) or start/end as Unix timestamps; series=1 adds per-bucket points."""
+    now = time.time()
+    try:
+        if 'start' in request.args:
+            start = float(request.args['start'])
+            end = float(request.args.get('end', now))
+        else:
+            duration = parse_duration(request.args.get('range', '1h'))
+            if duration is None:
+                raise ValueError(request.args.get('range'))
+            start, end = now - duration, now
+    except ValueError:
+        return {'error': 'invalid range, use range=15m|24h|7d or start/end timestamps'}, 400
+    return timeseries.query(key, start, end, series=request.args.get('series') == '1')
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition: probe histograms and counters plus current endpoint and WebSocket gauges"""
+    if shared_reader is not None:
+        text = shared_reader.meta('metrics', '')
+    else:
+        text = render_probe_metrics()
+    summary = status_store.snapshot.summary
+    hub = ws_hub.stats()
+    lines = metric_lines('api_monitor_endpoints', 'gauge', 'Endpoints by current status.',
+                         [((('status', 'success'),), summary['success_count']),
+                          ((('status', 'error'),), summary['error_count'])])
+    lines += metric_lines('api_monitor_endpoints_stale', 'gauge',
+                          'Endpoints still showing a result restored from the previous run.',
+                          [((), summary['stale_count'])])
+    lines += metric_lines('api_monitor_websocket_clients', 'gauge', 'Connected WebSocket clients.',
+                          [((), hub['clients'])])
+    lines += metric_lines('api_monitor_websocket_queued_messages', 'gauge',
+                          'Messages waiting in all WebSocket client queues.', [((), hub['queued'])])
+    lines += metric_lines('api_monitor_websocket_max_queue_depth', 'gauge',
+                          'Longest WebSocket client queue.', [((), hub['max_queue'])])
+    lines += metric_lines('api_monitor_websocket_published_total', 'counter',
+                          'Messages broadcast to WebSocket clients.', [((), hub['published'])])
+    lines += metric_lines('api_monitor_websocket_resyncs_total', 'counter',
+                          'Client backlogs coalesced into a full resync.', [((), hub['resyncs'])])
+    lines += metric_lines('api_monitor_websocket_evicted_total', 'counter',
+                          'Clients disconnected for lagging too long.', [((), hub['evicted'])])
+    return Response(text + '\n'.join(lines) + '\n', content_type=CONTENT_TYPE)
+
+
+@app.route('/data/timeouts')
+def get_timeouts():
+    """Get each endpoint's current probe timeout and the p99 latency it was derived from"""
+    if shared_reader is not None:
+        return {'endpoints': shared_reader.meta('timeouts', {})}
+    return {'endpoints': probe_timeouts.snapshot()}
+
+
+@app.route('/data/ws')
+def get_ws():
+    """Where the dashboard should open its WebSocket, plus hub queue statistics"""
+    return {'port': ws_hub.port, 'path': ws_hub.path, **ws_hub.stats()}
+
+
+def handle_client_message(data: Dict[str, Any]):
+    """Reply to a message from a WebSocket client"""
+    if data.get('type') == 'ping':
+        return {'type': 'pong'}
+    if data.get('type') == 'resume':
+        # Client asks for everything it missed since last_seq; anything but an integer gets the full state
+        last_seq = data.get('last_seq')
+        if not isinstance(last_seq, int) or isinstance(last_seq, bool):
+            last_seq = None
+        epoch = data.get('epoch')
+        return build_sync_message(last_seq, epoch if isinstance(epoch, str) else None)
+    if data.get('type') == 'request_status':
+        # Client explicitly requests current status
+        snapshot = status_store.snapshot
+        return {
+            'type': 'status_update',
             'timestamp': datetime.now().isoformat(),
-            'total_apis': len(api_status),
-            'success_count': success_count,
-            'error_count': error_count,
-            'apis': list(api_status.values()),
+            'seq': snapshot.seq,
+            **snapshot.summary,
             'loading': not initial_check_complete
         }
-        ws.send(json.dumps(initial_data))
-        logger.info(f"Sent initial data to client (loading: {not initial_check_complete}, apis: {len(api_status)})")
-    except Exception as e:
-        logger.error(f"Error sending initial data: {e}")
-
+    return None
+
+
+def handle_client_connect(query: Dict[str, str]):
+    """First message for a new WebSocket client. A reconnecting client passes
+    ?last_seq=N&epoch=E and only receives what changed since then."""
+    last_seq = query.get('last_seq')
+    sync = build_sync_message(int(last_seq) if last_seq and last_seq.isdigit() else None, query.get('epoch'))
+    logger.info(f"Client connected, sent {sync['type']} (seq: {sync['seq']}). Total clients: {len(ws_hub.clients)}")
+    return sync
+
+
+ws_hub = WebSocketHub('0.0.0.0', WS_PORT, on_connect=handle_client_connect, on_message=handle_client_message,
+                      resync=lambda: build_initial_message(status_store.snapshot),
+                      queue_size=WS_QUEUE_SIZE, max_lag=WS_MAX_LAG)
+
+
+def serve_http(port: int, reuse_port: bool = False):
+    """Serve the Flask app with a threaded WSGI server, optionally sharing the port with other workers"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind(('0.0.0.0', port))
+    listener.listen(1024)
+    server = make_server('0.0.0.0', port, app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+
+def run_producer():
+    """Run only the monitoring loop, publishing its state to the shared store"""
+    global shared_writer
+    shared_writer = SharedStateWriter(SHARED_STATE_DB)
+    shared_writer.reset(status_store.epoch)
+    status_store.add_listener(shared_writer.record)
+    logger.info(f"Producer writing shared state to {SHARED_STATE_DB}")
+    asyncio.run(monitoring_loop())
+
+
+def run_worker(port: int, ws_port: int):
+    """Serve HTTP and WebSocket clients from the shared store, without running any probes"""
+    global shared_reader
+    shared_reader = SharedStateReader(SHARED_STATE_DB)
+    ws_hub.port = ws_port
+    ws_hub.reuse_port = True
+    ws_hub.start()
+    Thread(target=follow_shared_state, daemon=True).start()
+    logger.info(f"Worker {os.getpid()} serving on ports {port}/{ws_port}")
+    serve_http(port, reuse_port=True)
+
+
+def run_serving(workers: int, port: int, ws_port: int):
+    """Start one producer and several workers sharing the HTTP and WebSocket ports"""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        print("serve 模式需要 SO_REUSEPORT 支持 (Linux/macOS)，请使用默认的 all 模式")
+        sys.exit(1)
+
+    script = os.path.abspath(__file__)
+    processes = [subprocess.Popen([sys.executable, script, '--mode', 'producer'])]
+    processes += [subprocess.Popen([sys.executable, script, '--mode', 'worker',
+                                    '--port', str(port), '--ws-port', str(ws_port)])
+                  for _ in range(workers)]
     try:
-        # Keep connection alive and handle incoming messages
-        while True:
-            message = ws.receive()
-            if message is None:
-                break
-            # Handle client messages if needed
-            data = json.loads(message)
-            if data.get('type') == 'ping':
-                ws.send(json.dumps({'type': 'pong'}))
-            elif data.get('type') == 'request_status':
-                # Client explicitly requests current status
-                try:
-                    success_count = sum(1 for s in api_status.values() if s['status'] == 'success')
-                    error_count = sum(1 for s in api_status.values() if s['status'] in ['error', 'timeout'])
-
-                    status_data = {
-                        'type': 'status_update',
-                        'timestamp': datetime.now().isoformat(),
-                        'total_apis': len(api_status),
-                        'success_count': success_count,
-                        'error_count': error_count,
-                        'categories': {},
-                        'loading': not initial_check_complete
-                    }
-
-                    # Add category breakdown
-                    for status in api_status.values():
-                        cat = status['category']
-                        if cat not in status_data['categories']:
-                            status_data['categories'][cat] = {'total': 0, 'success': 0, 'error': 0}
-                        status_data['categories'][cat]['total'] += 1
-                        if status['status'] == 'success':
-                            status_data['categories'][cat]['success'] += 1
-                        else:
-                            status_data['categories'][cat]['error'] += 1
-
-                    ws.send(json.dumps(status_data))
-                except Exception as e:
-                    logger.error(f"Error sending status update: {e}")
-
-    except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
     finally:
-        connected_clients.remove(ws)
-        logger.info(f"Client disconnected. Total clients: {len(connected_clients)}")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="上海图书馆开放数据API - 实时监控服务器")
+    parser.add_argument('--mode', choices=['all', 'serve', 'producer', 'worker'], default='all',
+                        help="all: 单进程运行监控和服务 (默认); serve: 1个监控进程 + 多个服务进程; "
+                             "producer/worker: 由 serve 启动的单个角色")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 2,
+                        help="serve 模式的服务进程数 (默认: CPU核数)")
+    parser.add_argument('--port', type=int, default=PORT, help=f"HTTP端口 (默认: {PORT})")
+    parser.add_argument('--ws-port', type=int, default=WS_PORT, help=f"WebSocket端口 (默认: {WS_PORT})")
+    return parser.parse_args()
 
 
 def main():
     """Main entry point"""
+    args = parse_args()
+    if args.mode == 'producer':
+        return run_producer()
+    if args.mode == 'worker':
+        return run_worker(args.port, args.ws_port)
+
     print("=" * 60)
     print("上海图书馆开放数据API - 实时监控服务器")
     print("=" * 60)
     print()
     print("功能特性:")
-    print("  - 实时API状态监控 (每30秒自动检查)")
+    print(f"  - 实时API状态监控 (按端点调度, 间隔{MIN_CHECK_INTERVAL}-{MAX_CHECK_INTERVAL}秒)")
     print("  - WebSocket实时推送状态更新")
     print("  - 响应时间统计")
     print("  - 可视化仪表板")
     print()
     print(f"API Key: {API_KEY[:10]}..." if len(API_KEY) > 10 else f"API Key: {API_KEY}")
-    print(f"检查间隔: {CHECK_INTERVAL}秒")
+    print(f"检查间隔: {CHECK_INTERVAL}秒 (失败时{MIN_CHECK_INTERVAL}秒, 稳定时最长{MAX_CHECK_INTERVAL}秒)")
     print(f"并发检查数: {MAX_CONCURRENT_CHECKS}")
+    if args.mode == 'serve':
+        print(f"运行模式: 1个监控进程 + {args.workers}个服务进程")
     print()
     print("服务器启动中...")
-    print("仪表板地址: http://localhost:5000")
+    print(f"仪表板地址: http://localhost:{args.port}")
+    print(f"WebSocket地址: ws://localhost:{args.ws_port}/ws")
     print("按 Ctrl+C 停止服务器")
     print("=" * 60)
     print()
 
-    # Start monitoring loop
+    if args.mode == 'serve':
+        run_serving(args.workers, args.port, args.ws_port)
+        print("服务器已停止")
+        return
+
+    # Start WebSocket hub and monitoring loop
+    ws_hub.port = args.ws_port
+    ws_hub.start()
     run_monitoring_in_thread()
 
     # Start Flask server
     try:
-        app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+        serve_http(args.port)
     except KeyboardInterrupt:
         print("\n正在停止服务器...")
         monitoring_active.clear()
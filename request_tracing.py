@@ -0,0 +1,255 @@
+"""
+请求追踪模块 - 记录每个请求各阶段（DNS、连接、TLS、首字节、传输、解析、写入）的耗时
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import TRACE_ENABLED, TRACE_FILE, TRACE_MAX_BYTES, TRACE_MAX_FILES
+from error_journal import ErrorJournal
+from utils import strip_api_key
+
+# 阶段名称及终端显示名称，按请求中发生的先后排列
+PHASES = [
+    ("dns", "DNS"),
+    ("connect", "连接"),
+    ("tls", "TLS"),
+    ("ttfb", "首字节"),
+    ("download", "传输"),
+    ("json_decode", "解析"),
+    ("disk_write", "写入"),
+]
+
+_local = threading.local()
+
+
+class RequestTrace:
+    """单个请求的追踪记录，各阶段以span表示，时间相对于请求开始"""
+
+    def __init__(self, name, url):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.url = strip_api_key(url)
+        self.started_at = datetime.now()
+        self.spans = []
+        self._t0 = time.perf_counter()
+        self._end = None
+
+    def add_span(self, phase, start, end, **attributes):
+        """
+        添加一个阶段
+
+        Args:
+            phase: 阶段名称，见 PHASES
+            start: 开始时间 (time.perf_counter)
+            end: 结束时间 (time.perf_counter)
+            **attributes: 附加信息，如主机名
+        """
+        span = {
+            "name": phase,
+            "start_ms": round((start - self._t0) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3)
+        }
+        if attributes:
+            span["attributes"] = attributes
+        self.spans.append(span)
+
+    def duration(self, phase):
+        """某阶段的总耗时（毫秒），同一阶段出现多次时累加"""
+        return round(sum(s["duration_ms"] for s in self.spans if s["name"] == phase), 3)
+
+    def setup_duration(self):
+        """建立连接（DNS、TCP连接、TLS握手）的总耗时（毫秒）"""
+        return sum(self.duration(phase) for phase in ("dns", "connect", "tls"))
+
+    def finish(self):
+        """结束追踪"""
+        if self._end is None:
+            self._end = time.perf_counter()
+
+    @property
+    def total_ms(self):
+        end = self._end if self._end is not None else time.perf_counter()
+        return round((end - self._t0) * 1000, 3)
+
+    def summary(self):
+        """
+        各阶段耗时汇总
+
+        Returns:
+            dict: 阶段 -> 毫秒，另含 total
+        """
+        timing = {phase: self.duration(phase) for phase, _ in PHASES}
+        timing["total"] = self.total_ms
+        return timing
+
+    def to_dict(self):
+        """导出为可写入日志的结构"""
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": self.started_at.isoformat(),
+            "name": self.name,
+            "url": self.url,
+            "duration_ms": self.total_ms,
+            "spans": self.spans
+        }
+
+
+def current_trace():
+    """获取当前线程正在进行的追踪，没有时返回 None"""
+    return getattr(_local, "trace", None)
+
+
+def bind_trace(fn):
+    """
+    包装 fn，使其在其他线程（如线程池）中调用时记录到当前线程进行中的追踪
+
+    Returns:
+        callable: 包装后的函数
+    """
+    trace = current_trace()
+
+    def run(*args, **kwargs):
+        previous = current_trace()
+        _local.trace = trace
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.trace = previous
+    return run
+
+
+def record_span(phase, start, end, **attributes):
+    """向当前线程的追踪添加一个阶段，没有进行中的追踪时忽略"""
+    trace = current_trace()
+    if trace is not None:
+        trace.add_span(phase, start, end, **attributes)
+
+
+@contextmanager
+def span(phase, **attributes):
+    """以上下文管理器的方式记录一个阶段"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(phase, start, time.perf_counter(), **attributes)
+
+
+@contextmanager
+def ttfb_span():
+    """记录首字节时间：从发送请求到收到响应头，扣除期间新建连接的耗时"""
+    trace = current_trace()
+    setup_before = trace.setup_duration() if trace is not None else 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            setup_ms = trace.setup_duration() - setup_before
+            trace.add_span("ttfb", start + setup_ms / 1000, time.perf_counter())
+
+
+@contextmanager
+def trace_request(name, url, exporter=None):
+    """
+    在当前线程开始一次请求追踪，结束时写入追踪日志
+
+    Args:
+        name: 端点名称
+        url: 请求URL
+        exporter: 追踪日志，默认使用 trace_exporter
+
+    Yields:
+        RequestTrace
+    """
+    previous = current_trace()
+    trace = RequestTrace(name, url)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _local.trace = previous
+        exporter = exporter or trace_exporter
+        if exporter is not None:
+            try:
+                exporter.append(trace.to_dict())
+            except OSError:
+                pass
+
+
+def format_timing(timing):
+    """
+    格式化阶段耗时，省略为0的阶段
+
+    Returns:
+        str: 如 "总计 120.5 ms (DNS 3.1, 连接 20.4, 首字节 80.2, 传输 10.3)"
+    """
+    parts = [f"{label} {timing[phase]:.1f}" for phase, label in PHASES if timing.get(phase)]
+    text = f"总计 {timing['total']:.1f} ms"
+    return f"{text} ({', '.join(parts)})" if parts else text
+
+
+class _ConnectTimingMixin:
+    """记录TCP连接耗时（DNS耗时由DNS缓存单独记录，从连接阶段中扣除）"""
+
+    def _new_conn(self):
+        trace = current_trace()
+        dns_before = trace.duration("dns") if trace is not None else 0
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            end = time.perf_counter()
+            if trace is not None:
+                dns_ms = trace.duration("dns") - dns_before
+                record_span("connect", start + dns_ms / 1000, end, host=self.host)
+
+
+class TracedHTTPConnection(_ConnectTimingMixin, HTTPConnection):
+    """记录连接耗时的HTTP连接"""
+
+
+class TracedHTTPSConnection(_ConnectTimingMixin, HTTPSConnection):
+    """记录连接和TLS握手耗时的HTTPS连接"""
+
+    def connect(self):
+        trace = current_trace()
+        setup_before = (trace.duration("dns") + trace.duration("connect")) if trace is not None else 0
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            end = time.perf_counter()
+            if trace is not None:
+                setup_ms = trace.duration("dns") + trace.duration("connect") - setup_before
+                record_span("tls", start + setup_ms / 1000, end, host=self.host)
+
+
+class TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TracedHTTPConnection
+
+
+class TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TracedHTTPSConnection
+
+
+class TracedHTTPAdapter(HTTPAdapter):
+    """使用可追踪连接的适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TracedHTTPConnectionPool,
+            "https": TracedHTTPSConnectionPool,
+        }
+
+
+# 追踪日志，与错误日志共用按大小和时间轮转的JSONL格式，只保留最近 TRACE_MAX_FILES 个轮转文件
+trace_exporter = (ErrorJournal(TRACE_FILE, max_bytes=TRACE_MAX_BYTES, index_file=None, max_files=TRACE_MAX_FILES)
+                  if TRACE_ENABLED else None)
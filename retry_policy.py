@@ -0,0 +1,173 @@
+"""
+重试策略模块 - 对幂等请求的瞬时失败按全抖动指数退避重试，按主机限制重试预算，
+并可在请求超过端点 p95 仍未返回时发送对冲请求
+"""
+import random
+import threading
+from config import (RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_STATUS_CODES,
+                    RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX, HEDGE_ENABLED)
+from utils import endpoint_key
+
+
+class RetryBudget:
+    """
+    按主机的重试预算
+
+    每次请求为其主机积累 ratio 次额度，最多 maximum 次；每次重试或对冲请求消耗1次。
+    主机持续失败时，额外请求最多为正常请求的 ratio 倍，不会形成重试风暴。
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, maximum=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def deposit(self, host):
+        """记录一次请求"""
+        with self._lock:
+            self._tokens[host] = min(self.maximum, self._tokens.get(host, self.maximum) + self.ratio)
+
+    def withdraw(self, host):
+        """
+        尝试消耗一次额度
+
+        Returns:
+            bool: 是否还有额度
+        """
+        with self._lock:
+            tokens = self._tokens.get(host, self.maximum)
+            if tokens < 1:
+                return False
+            self._tokens[host] = tokens - 1
+            return True
+
+
+class RetryPolicy:
+    """
+    重试与对冲策略
+
+    默认只重试GET请求，端点定义中的 retry 为 True/False 时以其为准；
+    只有连接错误、超时和 status_codes 中的状态码视为瞬时失败。
+    第 n 次重试前等待 [0, min(max_delay, base_delay × 2^n)] 内的随机时间（全抖动）。
+
+    对冲请求同样只用于可重试的端点，由 hedge 或端点定义中的 hedge 开启，
+    发送时消耗重试预算。
+
+    Args:
+        max_attempts: 包括第一次在内的最多尝试次数
+        base_delay: 退避基数（秒）
+        max_delay: 单次退避上限（秒）
+        status_codes: 视为瞬时失败的状态码
+        budget: RetryBudget
+        hedge: 是否默认发送对冲请求
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 status_codes=RETRY_STATUS_CODES, budget=None, hedge=HEDGE_ENABLED):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.status_codes = status_codes
+        self.budget = budget or RetryBudget()
+        self.hedge = hedge
+        self.retries = 0
+        self.exhausted = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def is_retryable(self, endpoint_def):
+        """端点是否可以重试（幂等）"""
+        return endpoint_def.get("retry", endpoint_def.get("method", "GET").upper() == "GET")
+
+    def is_transient(self, status_code=None, error=None):
+        """
+        判断一次失败是否值得重试
+
+        Args:
+            status_code: HTTP状态码，请求未完成时为 None
+            error: 请求未完成时的异常，或 None
+        """
+        if error is not None:
+            return True
+        return status_code in self.status_codes
+
+    def record_request(self, host):
+        """记录一次新请求（不含重试），为主机积累重试额度"""
+        self.budget.deposit(host)
+
+    def should_retry(self, endpoint_def, host, attempt):
+        """
+        第 attempt 次尝试（从0开始）瞬时失败后，是否再试一次；返回 True 时已消耗预算
+
+        Returns:
+            bool: 是否重试
+        """
+        if attempt + 1 >= self.max_attempts or not self.is_retryable(endpoint_def):
+            return False
+        if not self.budget.withdraw(host):
+            with self._lock:
+                self.exhausted += 1
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def backoff(self, attempt):
+        """第 attempt 次尝试失败后的等待时间（秒）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def hedge_delay(self, endpoint_def, timeouts):
+        """
+        对冲请求的等待时间：端点最近响应时间的 p95
+
+        Args:
+            endpoint_def: 端点定义
+            timeouts: 记录了端点响应时间的 AdaptiveTimeouts
+
+        Returns:
+            float: 秒数，不对冲或样本不足时为 None
+        """
+        if not endpoint_def.get("hedge", self.hedge) or not self.is_retryable(endpoint_def):
+            return None
+        return timeouts.latency_percentile(endpoint_key(endpoint_def), 0.95)
+
+    def start_hedge(self, host):
+        """
+        尝试发送对冲请求
+
+        Returns:
+            bool: 预算允许时为 True
+        """
+        if not self.budget.withdraw(host):
+            with self._lock:
+                self.exhausted += 1
+            return False
+        with self._lock:
+            self.hedges += 1
+        return True
+
+    def record_hedge_win(self):
+        """对冲请求先于第一次请求返回"""
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self):
+        """
+        获取重试统计
+
+        Returns:
+            dict: 重试次数、因预算不足放弃的次数、对冲请求数及其胜出次数
+        """
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "exhausted": self.exhausted,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins
+            }
+
+
+# 进程内共享的重试策略
+retry_policy = RetryPolicy()
@@ -0,0 +1,127 @@
+"""
+共享状态模块 - 通过SQLite（WAL模式）在监控进程和多个服务进程之间共享端点状态
+"""
+import json
+import os
+import sqlite3
+import threading
+from utils import ensure_directory_exists
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS status (
+    key TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    significant_seq INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS status_seq ON status (seq);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def connect(db_path, schema=SCHEMA):
+    """打开数据库并启用WAL，读取者和唯一的写入者互不阻塞"""
+    ensure_directory_exists(os.path.dirname(db_path))
+    connection = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(schema)
+    return connection
+
+
+class SharedStateWriter:
+    """
+    监控进程一侧：缓存状态写入，定期在一个事务中写入数据库
+
+    每个端点只保存最新结果，以及最后一次显著变化的序号，
+    服务进程据此维护自己的重放日志。
+    """
+
+    def __init__(self, db_path):
+        self.connection = connect(db_path)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def reset(self, epoch):
+        """清空上一次运行的状态，开始新的 epoch"""
+        with self._lock:
+            self._pending.clear()
+            with self.connection:
+                self.connection.execute("DELETE FROM status")
+                self.connection.execute("DELETE FROM meta")
+                self._set_meta({"epoch": epoch, "seq": 0})
+
+    def record(self, seq, key, result, significant):
+        """记录一次写入，可作为 StatusStore 的写入回调"""
+        with self._lock:
+            previous = self._pending.get(key)
+            if significant:
+                significant_seq = seq
+            elif previous is not None:
+                significant_seq = previous[1]
+            else:
+                significant_seq = None
+            self._pending[key] = (seq, significant_seq, result)
+
+    def flush(self, seq, **meta):
+        """
+        将缓存的写入和附加信息在一个事务中写入数据库
+
+        Args:
+            seq: 当前状态序号
+            **meta: 附加信息，如加载状态、调度快照，写入 meta 表（JSON）
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        with self.connection:
+            for key, (key_seq, significant_seq, result) in pending.items():
+                self.connection.execute(
+                    "INSERT INTO status (key, seq, significant_seq, result) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET seq = excluded.seq, result = excluded.result, "
+                    "significant_seq = CASE WHEN excluded.significant_seq IS NULL "
+                    "THEN status.significant_seq ELSE excluded.significant_seq END",
+                    (key, key_seq, significant_seq if significant_seq is not None else key_seq,
+                     json.dumps(result, ensure_ascii=False)))
+            self._set_meta({**meta, "seq": seq})
+
+    def _set_meta(self, values):
+        self.connection.executemany(
+            "INSERT INTO meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            [(name, json.dumps(value, ensure_ascii=False)) for name, value in values.items()])
+
+
+class SharedStateReader:
+    """服务进程一侧：读取监控进程写入的状态"""
+
+    def __init__(self, db_path):
+        self.connection = connect(db_path)
+        self._lock = threading.Lock()
+
+    def meta(self, name, default=None):
+        """读取一项附加信息"""
+        with self._lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def changes(self, since_seq):
+        """
+        读取某个序号之后写入的端点
+
+        Returns:
+            tuple: (epoch, 当前序号, [(key, result, seq, significant), ...])，按序号排列
+        """
+        with self._lock, self.connection:
+            # 在同一个读事务中读取，meta 中的序号与 status 表一致
+            self.connection.execute("BEGIN")
+            values = dict(self.connection.execute("SELECT name, value FROM meta WHERE name IN ('epoch', 'seq')"))
+            rows = self.connection.execute(
+                "SELECT key, result, seq, significant_seq FROM status WHERE seq > ? ORDER BY seq",
+                (since_seq,)).fetchall()
+        epoch = json.loads(values["epoch"]) if "epoch" in values else None
+        seq = json.loads(values["seq"]) if "seq" in values else 0
+        return epoch, seq, [(key, json.loads(result), row_seq, significant_seq > since_seq)
+                            for key, result, row_seq, significant_seq in rows]
@@ -17,7 +17,7 @@ call .venv\Scripts\activate.bat
 
 REM Install requirements if needed
 echo 检查依赖...
-pip show flask-sock >nul 2>&1
+pip show wsproto >nul 2>&1
 if errorlevel 1 (
     echo 安装实时监控依赖...
     pip install -r requirements_realtime.txt
@@ -17,7 +17,7 @@ source .venv/bin/activate
 
 # Install requirements if needed
 echo "检查依赖..."
-pip show flask-sock > /dev/null 2>&1
+pip show wsproto > /dev/null 2>&1
 if [ $? -ne 0 ]; then
     echo "安装实时监控依赖..."
     pip install -r requirements_realtime.txt
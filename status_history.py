@@ -0,0 +1,112 @@
+"""
+状态持久化模块 - 保存各端点的最新状态和最近的检查历史，重启后立即恢复
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from utils import atomic_open
+
+DEFAULT_HISTORY_SIZE = 50
+
+
+def history_entry(result):
+    """检查结果在历史中保留的字段"""
+    return {
+        'timestamp': result.get('timestamp'),
+        'status': result.get('status'),
+        'status_code': result.get('status_code'),
+        'response_time': result.get('response_time'),
+        'size': result.get('size')
+    }
+
+
+class StatusHistory:
+    """
+    端点状态的后写式持久化
+
+    作为 StatusStore 的写入回调，只在内存中记录最新结果和最近 history_size 次检查；
+    save_if_dirty() 由调用方定期调用，有变化时把全部内容原子地写入一个JSON文件，
+    进程退出时也会保存一次。检查路径上不做任何磁盘写入。
+    """
+
+    def __init__(self, path, history_size=DEFAULT_HISTORY_SIZE):
+        self.path = path
+        self.history_size = history_size
+        self._latest = {}
+        self._history = {}
+        self._dirty = False
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+        atexit.register(self.save_if_dirty)
+
+    def record(self, seq, key, result, significant):
+        """记录一次写入，可作为 StatusStore 的写入回调"""
+        with self._lock:
+            self._latest[key] = result
+            history = self._history.get(key)
+            if history is None:
+                history = self._history[key] = deque(maxlen=self.history_size)
+            history.append(history_entry(result))
+            self._dirty = True
+
+    def history(self, key):
+        """获取某个端点最近的检查历史，按时间顺序"""
+        with self._lock:
+            return list(self._history.get(key, ()))
+
+    def load(self):
+        """
+        读取上次保存的状态
+
+        Returns:
+            dict: 端点 -> 最新结果，文件不存在或已损坏时为空
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        with self._lock:
+            self._loaded_mtime = mtime
+            self._latest = dict(data.get('results', {}))
+            self._history = {key: deque(entries, maxlen=self.history_size)
+                             for key, entries in data.get('history', {}).items()}
+            return dict(self._latest)
+
+    def reload_if_changed(self):
+        """文件被其他进程更新后重新读取，供只读取不写入的进程使用"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def save_if_dirty(self):
+        """
+        有变化时保存到磁盘
+
+        Returns:
+            bool: 是否写入了文件
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {
+                'saved_at': time.time(),
+                'results': dict(self._latest),
+                'history': {key: list(entries) for key, entries in self._history.items()}
+            }
+            self._dirty = False
+        try:
+            with atomic_open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+        return True
@@ -0,0 +1,239 @@
+"""
+状态存储模块 - 实时监控的端点状态，以带序号的不可变快照发布给读取者，
+并保留最近的状态变化供客户端增量同步
+"""
+import threading
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from types import MappingProxyType
+
+
+# 响应时间分档（毫秒），与仪表板的 fast/medium/slow 显示一致
+LATENCY_BUCKETS = [(500, 'fast'), (2000, 'medium')]
+DEFAULT_REPLAY_SIZE = 1000
+
+
+def latency_bucket(response_time):
+    """响应时间所属的分档"""
+    if not response_time:
+        return None
+    for limit, name in LATENCY_BUCKETS:
+        if response_time < limit:
+            return name
+    return 'slow'
+
+
+def is_significant_change(previous, result):
+    """状态、响应时间分档、大小、熔断有变化，或重启前保存的结果被新检查替换时才需要推送给客户端"""
+    if previous is None:
+        return True
+    return (previous['status'] != result['status']
+            or previous.get('stale') != result.get('stale')
+            or previous.get('circuit_open') != result.get('circuit_open')
+            or latency_bucket(previous.get('response_time')) != latency_bucket(result.get('response_time'))
+            or previous.get('size') != result.get('size'))
+
+
+class StatusSnapshot:
+    """
+    某一时刻的端点状态，发布后不再修改
+
+    Attributes:
+        seq: 单调递增的序号，状态每变化一次加1
+        published_at: 发布时间 (ISO格式)
+        results: 端点 -> 检查结果 的只读映射
+        summary: WebSocket状态消息的计数部分
+        stats: /data/stats.json 的计数部分
+        categories: 分类汇总
+        apis: 所有端点的检查结果
+    """
+
+    __slots__ = ('seq', 'published_at', 'results', 'summary', 'stats', 'categories', 'apis')
+
+    def __init__(self, seq, results, summary, stats, categories):
+        self.seq = seq
+        self.published_at = datetime.now().isoformat()
+        self.results = MappingProxyType(results)
+        self.summary = summary
+        self.stats = stats
+        self.categories = categories
+        self.apis = tuple(results.values())
+
+
+class StatusStore:
+    """
+    端点状态存储
+
+    每次写入一个检查结果时，先减去该端点旧结果的贡献再加上新结果，
+    全局和分类计数的更新都是 O(1)，写入本身不复制结果表。
+    读取 snapshot 时，若有新的写入，才复制一份结果表，连同汇总视图发布为新的
+    StatusSnapshot（写时复制）；因此一批写入（如一次广播间隔内完成的检查）只发布一次，
+    一轮检查的总开销是 O(n) 而不是 O(n²)。没有新写入时读取者只读取一次引用，不需要加锁；
+    比较 seq 即可判断状态是否有变化。
+
+    有显著变化（见 is_significant_change）的写入按 seq 记入有界的重放日志，
+    客户端凭最后收到的 seq 可以只获取之后变化的端点。
+
+    写入的结果字典在写入后不应再修改。
+    """
+
+    def __init__(self, replay_size=DEFAULT_REPLAY_SIZE, epoch=None):
+        self._results = {}
+        self._status_counts = Counter()
+        self._categories = {}
+        self._total_size = 0
+        # 从上次运行恢复、尚未被新检查替换的结果数
+        self._stale = 0
+        self._seq = 0
+        # 区分不同进程的序号，服务器重启后序号重新从0开始
+        self.epoch = epoch or uuid.uuid4().hex[:8]
+        # (seq, key)，按 seq 递增
+        self._replay = deque(maxlen=replay_size)
+        # 已被挤出重放日志的最大 seq，早于它的客户端无法增量同步
+        self._replay_floor = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._snapshot = self._build_snapshot()
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def seq(self):
+        """最新写入的序号，不发布快照"""
+        return self._seq
+
+    @property
+    def snapshot(self):
+        """最新的快照，有未发布的写入时先发布"""
+        if self._dirty:
+            with self._lock:
+                self._publish()
+        return self._snapshot
+
+    def _publish(self):
+        if self._dirty:
+            # 单次引用赋值即完成发布，读取者看到的要么是旧快照，要么是新快照
+            self._snapshot = self._build_snapshot()
+            self._dirty = False
+        return self._snapshot
+
+    def _apply(self, result, sign):
+        size = result.get('size', 0) or 0
+        success = result['status'] == 'success'
+        category = self._categories.setdefault(result['category'], {'total': 0, 'success': 0, 'error': 0, 'size': 0})
+        category['total'] += sign
+        category['success' if success else 'error'] += sign
+        category['size'] += sign * size
+        if category['total'] == 0:
+            del self._categories[result['category']]
+        self._status_counts[result['status']] += sign
+        self._total_size += sign * size
+        if result.get('stale'):
+            self._stale += sign
+
+    def add_listener(self, callback):
+        """
+        注册写入回调，在写入者的锁内以 (seq, key, result, significant) 调用，应尽快返回
+        """
+        self._listeners.append(callback)
+
+    def update(self, key, result, seq=None, significant=None):
+        """
+        写入一个端点的最新检查结果，新快照在下次读取 snapshot 时发布
+
+        Args:
+            key: 端点唯一标识
+            result: check_single_api 返回的结果
+            seq: 使用给定的序号而不是自增，用于跟随其他进程的状态
+            significant: 是否为显著变化，默认由 is_significant_change 判断
+
+        Returns:
+            int: 写入后的序号
+        """
+        with self._lock:
+            self._write(key, result, seq, significant)
+            return self._seq
+
+    def update_many(self, updates):
+        """
+        依次写入多个结果
+
+        Args:
+            updates: (key, result, seq, significant) 的可迭代对象，seq 和 significant 可为 None
+
+        Returns:
+            int: 写入后的序号
+        """
+        with self._lock:
+            for key, result, seq, significant in updates:
+                self._write(key, result, seq, significant)
+            return self._seq
+
+    def _write(self, key, result, seq, significant):
+        previous = self._results.get(key)
+        if previous is not None:
+            self._apply(previous, -1)
+        self._results[key] = result
+        self._apply(result, 1)
+        self._seq = self._seq + 1 if seq is None else seq
+        self._dirty = True
+        if significant is None:
+            significant = is_significant_change(previous, result)
+        for callback in self._listeners:
+            callback(self._seq, key, result, significant)
+        if significant:
+            if len(self._replay) == self._replay.maxlen:
+                self._replay_floor = self._replay[0][0]
+            self._replay.append((self._seq, key))
+
+    def get(self, key):
+        """获取某个端点的最新结果"""
+        return self.snapshot.results.get(key)
+
+    def changes_since(self, seq, epoch=None):
+        """
+        获取某个序号之后有显著变化的端点
+
+        Args:
+            seq: 客户端最后收到的序号
+            epoch: 客户端记录的 epoch，与当前进程不同时无法增量同步
+
+        Returns:
+            tuple: (快照, 变化端点的当前结果列表)；无法增量同步时列表为 None
+        """
+        with self._lock:
+            snapshot = self._publish()
+            if (epoch is not None and epoch != self.epoch) or seq < self._replay_floor or seq > snapshot.seq:
+                return snapshot, None
+            keys = dict.fromkeys(key for entry_seq, key in self._replay if entry_seq > seq)
+        return snapshot, [snapshot.results[key] for key in keys]
+
+    def _build_snapshot(self):
+        total = len(self._results)
+        success = self._status_counts['success']
+        error = self._status_counts['error'] + self._status_counts['timeout']
+        summary = {
+            'total_apis': total,
+            'success_count': success,
+            'error_count': error,
+            'stale_count': self._stale,
+            'categories': {name: {'total': c['total'], 'success': c['success'], 'error': c['error']}
+                           for name, c in self._categories.items()}
+        }
+        stats = {
+            'totalApis': total,
+            'successCount': success,
+            'errorCount': error,
+            'staleCount': self._stale,
+            'successRate': round(success / total * 100, 1) if total else 0,
+            'categoryCount': len(self._categories),
+            'totalSize': self._total_size,
+            'fileCount': success
+        }
+        categories = {name: {'count': c['total'], 'totalSize': c['size'],
+                             'success': c['success'], 'error': c['error']}
+                      for name, c in self._categories.items()}
+        return StatusSnapshot(self._seq, dict(self._results), summary, stats, categories)
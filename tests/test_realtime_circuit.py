@@ -0,0 +1,48 @@
+"""实时监控的熔断测试：主机不可用时，熔断前发出的探测不超过阈值"""
+import asyncio
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import realtime_server as rs
+from circuit_breaker import CircuitBreakers
+from retry_policy import RetryPolicy
+
+HOST_THRESHOLD = 5
+
+
+def dead_port():
+    """返回一个没有服务监听的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_dead_host_gets_at_most_threshold_probes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rs, "probe_circuits", CircuitBreakers(host_threshold=HOST_THRESHOLD, endpoint_threshold=3,
+                                                              reset_timeout=60))
+    policy = RetryPolicy()
+    # 退避远长于连接被拒绝的耗时，重试前其他端点的失败都已记录
+    monkeypatch.setattr(policy, "backoff", lambda attempt: 0.05)
+    monkeypatch.setattr(rs, "retry_policy", policy)
+    monkeypatch.setattr(rs.rate_limiter, "default_limit", (1e9, 1e9))
+
+    probes = []
+    check_single_api = rs.check_single_api
+
+    def counting_check(api):
+        probes.append(api["name"])
+        return check_single_api(api)
+
+    monkeypatch.setattr(rs, "check_single_api", counting_check)
+
+    url = f"http://127.0.0.1:{dead_port()}/api"
+    apis = [{"name": f"endpoint {i}", "category": "test", "method": "GET", "url": url} for i in range(12)]
+    results = asyncio.run(rs.check_apis_batch(apis))
+
+    assert len(probes) <= HOST_THRESHOLD
+    assert sum(1 for result in results if result.get("circuit_open")) >= len(apis) - HOST_THRESHOLD
+    assert rs.probe_circuits.snapshot()["hosts"][rs.get_api_host(apis[0])]["state"] == "open"
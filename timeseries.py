@@ -0,0 +1,365 @@
+"""
+时序存储模块 - 记录每次检查的响应时间、可用性和大小，按1分钟、1小时、1天汇总，
+支持按时间范围查询分位数、可用率和大小，内存占用与运行时间无关
+"""
+import bisect
+import json
+import re
+import threading
+import time
+from collections import deque
+from adaptive_concurrency import percentile
+from shared_state import connect
+
+# 汇总层级: (名称, 桶宽度秒数, 保留秒数)
+TIERS = [
+    ('1m', 60, 24 * 3600),
+    ('1h', 3600, 30 * 24 * 3600),
+    ('1d', 86400, 365 * 24 * 3600),
+]
+# 每个端点在内存中保留的原始样本数
+DEFAULT_RAW_SIZE = 500
+# 响应时间直方图的桶上界（毫秒），按约1.26倍递增，1ms到约63s，分位数误差约13%
+LATENCY_BOUNDS = [round(10 ** (i / 10), 1) for i in range(49)]
+PERCENTILES = [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    key TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (key, tier, start)
+);
+"""
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(text):
+    """
+    解析时间长度，如 '90s'、'15m'、'24h'、'7d'
+
+    Returns:
+        int: 秒数，格式不正确时返回 None
+    """
+    match = re.fullmatch(r'(\d+)([smhd])', text or '')
+    if not match:
+        return None
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class Bucket:
+    """一个时间桶内的汇总：检查次数、成功次数、响应时间直方图和大小"""
+
+    __slots__ = ('start', 'count', 'ok', 'latency_count', 'latency_sum', 'latency_max',
+                 'histogram', 'size_count', 'size_sum', 'size_min', 'size_max')
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.ok = 0
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # 直方图桶下标 -> 次数，只保存非零的桶
+        self.histogram = {}
+        self.size_count = 0
+        self.size_sum = 0
+        self.size_min = None
+        self.size_max = None
+
+    def add(self, latency, ok, size):
+        """加入一次检查"""
+        self.count += 1
+        self.ok += ok
+        if latency is not None:
+            self.latency_count += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            index = min(bisect.bisect_left(LATENCY_BOUNDS, latency), len(LATENCY_BOUNDS) - 1)
+            self.histogram[index] = self.histogram.get(index, 0) + 1
+        if size is not None:
+            self.size_count += 1
+            self.size_sum += size
+            self.size_min = size if self.size_min is None else min(self.size_min, size)
+            self.size_max = size if self.size_max is None else max(self.size_max, size)
+
+    def merge(self, other):
+        """合并另一个桶的汇总"""
+        self.count += other.count
+        self.ok += other.ok
+        self.latency_count += other.latency_count
+        self.latency_sum += other.latency_sum
+        self.latency_max = max(self.latency_max, other.latency_max)
+        for index, n in other.histogram.items():
+            self.histogram[index] = self.histogram.get(index, 0) + n
+        self.size_count += other.size_count
+        self.size_sum += other.size_sum
+        for value in (other.size_min, other.size_max):
+            if value is not None:
+                self.size_min = value if self.size_min is None else min(self.size_min, value)
+                self.size_max = value if self.size_max is None else max(self.size_max, value)
+
+    def latency_percentile(self, fraction):
+        """由直方图估算响应时间分位数，取所在桶的上界，不超过观测到的最大值"""
+        if not self.latency_count:
+            return None
+        target = fraction * self.latency_count
+        seen = 0
+        for index in sorted(self.histogram):
+            seen += self.histogram[index]
+            if seen >= target:
+                return min(LATENCY_BOUNDS[index], self.latency_max)
+        return self.latency_max
+
+    def summary(self):
+        """可用率、响应时间分位数和大小"""
+        return {
+            'count': self.count,
+            'availability': round(self.ok / self.count * 100, 2) if self.count else None,
+            'latency': {
+                **{name: self.latency_percentile(fraction) for name, fraction in PERCENTILES},
+                'avg': round(self.latency_sum / self.latency_count, 2) if self.latency_count else None,
+                'max': self.latency_max if self.latency_count else None
+            },
+            'size': {
+                'avg': round(self.size_sum / self.size_count) if self.size_count else None,
+                'min': self.size_min,
+                'max': self.size_max
+            }
+        }
+
+    def to_json(self):
+        return json.dumps([self.count, self.ok, self.latency_count, self.latency_sum, self.latency_max,
+                           self.histogram, self.size_count, self.size_sum, self.size_min, self.size_max])
+
+    @classmethod
+    def from_json(cls, start, text):
+        bucket = cls(start)
+        (bucket.count, bucket.ok, bucket.latency_count, bucket.latency_sum, bucket.latency_max, histogram,
+         bucket.size_count, bucket.size_sum, bucket.size_min, bucket.size_max) = json.loads(text)
+        bucket.histogram = {int(index): n for index, n in histogram.items()}
+        return bucket
+
+
+class TimeSeriesStore:
+    """
+    端点检查结果的时序存储
+
+    每次检查写入该端点的原始样本环形缓冲区，并累加到各层级当前的时间桶。
+    内存中每个端点只保留 raw_size 个原始样本和每个层级最近的两个桶，
+    完整的汇总历史在SQLite中，因此内存占用与运行时间无关。
+    变化过的桶由 flush() 在一个事务中写入数据库，并删除超出保留期的桶；
+    重启后由 load() 读回各层级当前的桶，继续累加。不记录检查的进程可以直接查询
+    其他进程写入的数据库。
+
+    查询时若原始样本覆盖整个时间范围，分位数按原始样本精确计算，
+    否则使用能覆盖该范围的最细层级，由直方图估算。
+
+    Args:
+        db_path: SQLite数据库路径，为 None 时只能查询内存中的数据
+        raw_size: 每个端点保留的原始样本数
+        clock: 返回当前时间戳（秒）的函数
+    """
+
+    def __init__(self, db_path=None, raw_size=DEFAULT_RAW_SIZE, clock=time.time):
+        self.db_path = db_path
+        self.raw_size = raw_size
+        self.clock = clock
+        # key -> deque[(时间戳, 响应时间, 是否成功, 大小)]
+        self._raw = {}
+        # 层级名称 -> key -> deque[Bucket]，最近的两个桶，容纳跨桶边界稍晚完成的检查
+        self._recent = {name: {} for name, _, _ in TIERS}
+        # (key, 层级名称) -> {start: Bucket}，等待写入数据库
+        self._dirty = {}
+        self._connection = None
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = connect(self.db_path, SCHEMA)
+        return self._connection
+
+    def _execute(self, sql, parameters=()):
+        with self._db_lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    def keys(self):
+        """有数据的端点"""
+        with self._lock:
+            keys = set(self._raw)
+        if self.db_path is not None:
+            keys.update(key for key, in self._execute("SELECT DISTINCT key FROM rollup"))
+        return sorted(keys)
+
+    def record(self, seq, key, result, significant):
+        """
+        记录一次检查结果，可作为 StatusStore 的写入回调；跳过重启后恢复的旧结果和熔断时的快速失败。
+        超时和连接错误没有响应，只计入可用率，不计入响应时间和大小
+        """
+        if result.get('stale') or result.get('circuit_open'):
+            return
+        responded = result.get('status_code') is not None
+        self.add(key, self.clock(), result.get('response_time') if responded else None,
+                 result.get('status') == 'success', result.get('size') if responded else None)
+
+    def add(self, key, timestamp, latency, ok, size):
+        """
+        写入一次检查
+
+        Args:
+            key: 端点唯一标识
+            timestamp: 检查时间戳（秒）
+            latency: 响应时间（毫秒），没有响应时为 None
+            ok: 是否成功
+            size: 响应大小（字节），未知时为 None
+        """
+        with self._lock:
+            raw = self._raw.get(key)
+            if raw is None:
+                raw = self._raw[key] = deque(maxlen=self.raw_size)
+            raw.append((timestamp, latency, ok, size))
+            for name, width, _ in TIERS:
+                bucket = self._bucket_for(name, key, int(timestamp // width * width))
+                if bucket is None:
+                    continue
+                bucket.add(latency, ok, size)
+                self._dirty.setdefault((key, name), {})[bucket.start] = bucket
+
+    def _bucket_for(self, name, key, start):
+        buckets = self._recent[name].get(key)
+        if buckets is None:
+            buckets = self._recent[name][key] = deque(maxlen=2)
+        for bucket in buckets:
+            if bucket.start == start:
+                return bucket
+        if buckets and buckets[-1].start > start:
+            # 比最近两个桶更早的迟到检查，只保留在原始样本中
+            return None
+        bucket = Bucket(start)
+        buckets.append(bucket)
+        return bucket
+
+    def flush(self):
+        """
+        将变化过的桶写入数据库，并删除超出保留期的桶
+
+        Returns:
+            int: 写入的桶数
+        """
+        if self.db_path is None:
+            return 0
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            rows = [(key, name, start, bucket.to_json())
+                    for (key, name), buckets in dirty.items() for start, bucket in buckets.items()]
+        now = self.clock()
+        try:
+            with self._db_lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO rollup (key, tier, start, data) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(key, tier, start) DO UPDATE SET data = excluded.data", rows)
+                    connection.executemany("DELETE FROM rollup WHERE tier = ? AND start < ?",
+                                           [(name, now - retention) for name, _, retention in TIERS])
+        except Exception:
+            # 桶对象仍在内存中，下次 flush 时重新写入
+            with self._lock:
+                for target, buckets in dirty.items():
+                    self._dirty.setdefault(target, {}).update(buckets)
+            raise
+        return len(rows)
+
+    def load(self):
+        """
+        读取数据库中各层级当前的桶，在开始记录之前调用
+
+        Returns:
+            int: 读取的桶数
+        """
+        if self.db_path is None:
+            return 0
+        now = self.clock()
+        loaded = 0
+        for name, width, _ in TIERS:
+            rows = self._execute("SELECT key, start, data FROM rollup WHERE tier = ? AND start >= ?",
+                                 (name, int(now // width * width)))
+            with self._lock:
+                for key, start, data in rows:
+                    self._recent[name].setdefault(key, deque(maxlen=2)).append(Bucket.from_json(start, data))
+            loaded += len(rows)
+        return loaded
+
+    def query(self, key, start, end=None, series=False):
+        """
+        查询某个端点在一段时间内的可用率、响应时间分位数和大小
+
+        Args:
+            key: 端点唯一标识
+            start: 起始时间戳（秒）
+            end: 结束时间戳（秒），默认为当前时间
+            series: 是否同时返回每个桶的汇总
+
+        Returns:
+            dict: 汇总结果；resolution 为计算分位数所用的精度 ('raw' 或层级名称)
+        """
+        end = self.clock() if end is None else end
+        name, width = self._tier_for(start, end)
+        buckets = {}
+        if self.db_path is not None:
+            rows = self._execute(
+                "SELECT start, data FROM rollup WHERE key = ? AND tier = ? AND start > ? AND start <= ?",
+                (key, name, start - width, end))
+            buckets = {bucket_start: Bucket.from_json(bucket_start, data) for bucket_start, data in rows}
+        with self._lock:
+            raw = list(self._raw.get(key, ()))
+            # 内存中的桶可能比数据库中的更新
+            for bucket in self._recent[name].get(key, ()):
+                if start - width < bucket.start <= end:
+                    buckets[bucket.start] = Bucket.from_json(bucket.start, bucket.to_json())
+        buckets = [buckets[bucket_start] for bucket_start in sorted(buckets)]
+        samples = [sample for sample in raw if start <= sample[0] <= end]
+        # 原始样本覆盖整个范围：最早的样本不晚于起始时间，或者范围内各桶的检查都还在原始样本中
+        # （如重启后不久，环形缓冲区尚未写满）
+        raw_covers = bool(raw) and raw[0][0] <= start
+        if not raw_covers and raw and buckets:
+            span_start, span_end = buckets[0].start, buckets[-1].start + width
+            raw_covers = (sum(1 for sample in raw if span_start <= sample[0] < span_end)
+                          >= sum(bucket.count for bucket in buckets))
+
+        result = {'key': key, 'start': start, 'end': end, 'tier': name}
+        if raw_covers:
+            result['resolution'] = 'raw'
+            result.update(self._raw_summary(samples))
+        else:
+            total = Bucket(start)
+            for bucket in buckets:
+                total.merge(bucket)
+            result['resolution'] = name
+            result.update(total.summary())
+        if series:
+            result['series'] = [{'start': bucket.start, **bucket.summary()} for bucket in buckets]
+        return result
+
+    def _tier_for(self, start, end):
+        """能覆盖起始时间、且桶数不过多的最细层级"""
+        now = self.clock()
+        for name, width, retention in TIERS:
+            if start >= now - retention and (end - start) / width <= 1500:
+                return name, width
+        name, width, _ = TIERS[-1]
+        return name, width
+
+    @staticmethod
+    def _raw_summary(samples):
+        bucket = Bucket(0)
+        for _, latency, ok, size in samples:
+            bucket.add(latency, ok, size)
+        summary = bucket.summary()
+        latencies = [latency for _, latency, _, _ in samples if latency is not None]
+        for name, fraction in PERCENTILES:
+            summary['latency'][name] = percentile(latencies, fraction)
+        return summary
@@ -3,7 +3,18 @@
 """
 import re
 import os
-import json
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 携带API密钥的查询参数名，写入磁盘前从URL中去掉
+API_KEY_PARAMS = frozenset({'key', 'apiKey'})
+
+# 新建文件的权限（0666 去掉 umask），首次使用时确定；读取 umask 不修改进程状态
+_file_mode = None
+_file_mode_lock = threading.Lock()
 
 
 def sanitize_filename(name):
@@ -28,6 +39,85 @@ def ensure_directory_exists(directory):
         os.makedirs(directory)
 
 
+def endpoint_key(endpoint_def):
+    """
+    端点的统计键，用于自适应超时、熔断器等按端点保存的状态
+
+    同一端点模板的不同请求（如PDF的各个分页）在定义中用 endpoint 指定共同的键，
+    否则为端点名称。
+    """
+    return endpoint_def.get("endpoint", endpoint_def["name"])
+
+
+def get_host(url):
+    """
+    从URL中提取主机名（含端口），用于按主机分组限流
+    """
+    return urlsplit(url).netloc.lower()
+
+
+def strip_api_key(url):
+    """
+    去掉URL中携带API密钥的查询参数，用于把URL写入缓存元数据、追踪日志等文件
+    """
+    if not url:
+        return url
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name not in API_KEY_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _new_file_mode(directory):
+    """
+    普通方式新建文件时得到的权限
+
+    os.umask() 只能先设置再读回，会短暂改变整个进程的 umask，因此改为在 directory 中
+    以 0666 新建一个探测文件，读取系统按 umask 实际给出的权限后删除，只探测一次。
+    """
+    global _file_mode
+    with _file_mode_lock:
+        if _file_mode is None:
+            probe = os.path.join(directory, f'.tmp-mode-{uuid.uuid4().hex}')
+            fd = os.open(probe, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            try:
+                _file_mode = os.fstat(fd).st_mode & 0o777
+            finally:
+                os.close(fd)
+                os.remove(probe)
+        return _file_mode
+
+
+@contextmanager
+def atomic_open(filepath, mode='wb', **kwargs):
+    """
+    原子写入文件：先写入同目录下的临时文件，成功后再重命名为目标文件，
+    写入中途失败时删除临时文件，目标文件保持原样。
+    新文件的权限与普通方式新建的文件相同，覆盖已有文件时保留其权限
+
+    Args:
+        filepath: 目标文件路径
+        mode: 写入模式，'wb' 或 'w'
+        **kwargs: 传给 open 的其他参数，如 encoding
+    """
+    directory = os.path.dirname(filepath) or '.'
+    ensure_directory_exists(directory)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.splitext(filepath)[1])
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        try:
+            file_mode = os.stat(filepath).st_mode & 0o777
+        except FileNotFoundError:
+            file_mode = _new_file_mode(directory)
+        os.chmod(tmp_path, file_mode)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def format_response_size(content):
     """
     格式化响应大小显示
@@ -39,33 +129,16 @@ def format_response_size(content):
     else:
         size = len(str(content))
 
+    return format_byte_size(size)
+
+
+def format_byte_size(size):
+    """
+    格式化字节数显示
+    """
     if size < 1024:
         return f"{size} bytes"
     elif size < 1024 * 1024:
         return f"{size / 1024:.1f} KB"
     else:
         return f"{size / (1024 * 1024):.1f} MB"
-
-def log_error_to_json(error_data, log_file):
-    """
-    将错误信息记录到JSON日志文件
-
-    Args:
-        error_data (dict): 包含错误信息的字典
-        log_file (str): 日志文件的路径
-    """
-    ensure_directory_exists(os.path.dirname(log_file))
-
-    try:
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                errors = json.load(f)
-        else:
-            errors = []
-    except (json.JSONDecodeError, FileNotFoundError):
-        errors = []
-
-    errors.append(error_data)
-
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump(errors, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,303 @@
+"""
+WebSocket推送模块 - 在单个asyncio线程中服务所有WebSocket连接，
+广播消息只编码一次，再放入各客户端的有界发送队列
+"""
+import asyncio
+import json
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qsl
+from wsproto import WSConnection, ConnectionType
+from wsproto.connection import ConnectionState
+from wsproto.events import (AcceptConnection, RejectConnection, Request, TextMessage,
+                            BytesMessage, Ping, CloseConnection)
+from wsproto.utilities import RemoteProtocolError
+
+logger = logging.getLogger(__name__)
+
+# 1013: Try Again Later，被驱逐的客户端应稍后重连并增量同步
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def encode_text_frame(text):
+    """
+    将文本编码为一个完整的WebSocket文本帧
+
+    服务器发出的帧不加掩码，且未协商扩展，因此同一条消息对所有客户端的字节完全相同，
+    只需编码一次。
+    """
+    payload = text.encode('utf-8')
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+    return header + payload
+
+
+class HubClient:
+    """一个WebSocket连接及其发送队列"""
+
+    def __init__(self, connection, writer, query):
+        self.connection = connection
+        self.writer = writer
+        self.query = query
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        # 队列溢出后丢弃积压的消息，改为发送一次完整状态
+        self.needs_resync = False
+        self.lagging_since = None
+        self.closed = False
+
+    def write(self, data):
+        if not self.closed:
+            self.writer.write(data)
+
+
+class WebSocketHub:
+    """
+    WebSocket推送中心
+
+    所有连接由一个线程中的asyncio事件循环处理，不为每个连接占用线程。
+    publish() 可在任意线程调用：消息编码为帧后交给事件循环，追加到每个客户端的
+    有界队列，由各自的发送任务写出，慢客户端只会阻塞自己的发送任务。
+
+    队列满时丢弃该客户端积压的增量消息，改为在它赶上后发送一次完整状态（合并）；
+    持续积压超过 max_lag 秒的客户端会被断开，由客户端重连后增量同步。
+
+    Args:
+        host, port: 监听地址
+        path: WebSocket路径
+        on_connect: 新连接建立后调用，参数为查询参数dict，返回首条消息
+        on_message: 收到客户端JSON消息时调用，返回要回复的消息或 None
+        resync: 返回完整状态消息，用于队列溢出后的客户端
+        queue_size: 每个客户端最多积压的消息数
+        max_lag: 持续积压多少秒后断开客户端
+        reuse_port: 允许多个进程监听同一端口 (SO_REUSEPORT)
+    """
+
+    def __init__(self, host, port, path='/ws', on_connect=None, on_message=None, resync=None,
+                 queue_size=64, max_lag=30.0, reuse_port=False):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.on_connect = on_connect
+        self.on_message = on_message
+        self.resync = resync
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.reuse_port = reuse_port
+        self.clients = set()
+        self.published = 0
+        self.resyncs = 0
+        self.evicted = 0
+        self._loop = None
+        self._server = None
+
+    def start(self):
+        """在后台线程中启动事件循环和WebSocket服务器，监听成功后返回"""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._handle, self.host, self.port, backlog=1024,
+                                         reuse_port=self.reuse_port or None))
+            except OSError as e:
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, daemon=True, name='ws-hub').start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        """关闭服务器和所有连接"""
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for client in list(self.clients):
+                client.writer.close()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def publish(self, message):
+        """
+        向所有客户端广播一条消息，可在任意线程调用
+
+        Args:
+            message: 可JSON序列化的消息
+        """
+        if self._loop is None:
+            return
+        frame = encode_text_frame(json.dumps(message))
+        self._loop.call_soon_threadsafe(self._fan_out, frame)
+
+    def _fan_out(self, frame):
+        self.published += 1
+        now = time.monotonic()
+        for client in list(self.clients):
+            if len(client.queue) < self.queue_size:
+                client.queue.append(frame)
+            else:
+                # 合并：积压的增量消息已无意义，赶上后发送一次完整状态
+                client.queue.clear()
+                if not client.needs_resync:
+                    client.needs_resync = True
+                    self.resyncs += 1
+                if client.lagging_since is None:
+                    client.lagging_since = now
+                elif now - client.lagging_since > self.max_lag:
+                    self._evict(client)
+                    continue
+            client.wakeup.set()
+
+    def _evict(self, client):
+        self.evicted += 1
+        logger.warning(f"Evicting slow WebSocket client (lagging {self.max_lag}s)")
+        try:
+            client.write(client.connection.send(CloseConnection(code=CLOSE_TRY_AGAIN_LATER, reason='too slow')))
+        except Exception:
+            pass
+        client.closed = True
+        client.writer.close()
+        self.clients.discard(client)
+
+    def stats(self):
+        """
+        获取推送统计
+
+        Returns:
+            dict: 连接数、队列中的消息总数和最大值、已广播、合并和驱逐次数
+        """
+        depths = [len(client.queue) for client in list(self.clients)]
+        return {
+            'clients': len(depths),
+            'queued': sum(depths),
+            'max_queue': max(depths, default=0),
+            'published': self.published,
+            'resyncs': self.resyncs,
+            'evicted': self.evicted
+        }
+
+    def _send_json(self, client, message):
+        client.queue.append(encode_text_frame(json.dumps(message)))
+        client.wakeup.set()
+
+    async def _pump(self, client):
+        """把客户端队列中的消息依次写出，写缓冲区满时只等待这一个客户端"""
+        while not client.closed:
+            await client.wakeup.wait()
+            client.wakeup.clear()
+            while (client.queue or client.needs_resync) and not client.closed:
+                if client.needs_resync:
+                    client.needs_resync = False
+                    client.queue.clear()
+                    frame = encode_text_frame(json.dumps(self.resync()))
+                else:
+                    frame = client.queue.popleft()
+                client.write(frame)
+                await client.writer.drain()
+            client.lagging_since = None
+
+    async def _handshake(self, reader, writer):
+        """
+        完成WebSocket握手
+
+        Returns:
+            tuple: (WSConnection, 查询参数)，握手失败时返回 (None, None)
+        """
+        connection = WSConnection(ConnectionType.SERVER)
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return None, None
+            try:
+                connection.receive_data(data)
+            except RemoteProtocolError:
+                writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                return None, None
+            for event in connection.events():
+                if isinstance(event, Request):
+                    target = urlsplit(event.target)
+                    if target.path != self.path:
+                        writer.write(connection.send(RejectConnection(status_code=404)))
+                        return None, None
+                    writer.write(connection.send(AcceptConnection()))
+                    return connection, dict(parse_qsl(target.query))
+
+    async def _handle(self, reader, writer):
+        client = None
+        pump = None
+        try:
+            connection, query = await self._handshake(reader, writer)
+            if connection is None:
+                return
+
+            client = HubClient(connection, writer, query)
+            self.clients.add(client)
+            pump = asyncio.create_task(self._pump(client))
+            if self.on_connect:
+                self._send_json(client, self.on_connect(query))
+
+            text = []
+            while not client.closed:
+                data = await reader.read(65536)
+                connection.receive_data(data or None)
+                for event in connection.events():
+                    if isinstance(event, TextMessage):
+                        text.append(event.data)
+                        if event.message_finished:
+                            self._dispatch(client, ''.join(text))
+                            text = []
+                    elif isinstance(event, Ping):
+                        client.write(connection.send(event.response()))
+                    elif isinstance(event, CloseConnection):
+                        # A dropped TCP connection arrives as CloseConnection(1006) in state CLOSED,
+                        # with nobody left to answer
+                        if connection.state is ConnectionState.REMOTE_CLOSING:
+                            client.write(connection.send(event.response()))
+                        client.closed = True
+                    elif isinstance(event, BytesMessage):
+                        pass
+                if not data:
+                    break
+        except (ConnectionError, RemoteProtocolError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"WebSocket error: {e}")
+        finally:
+            if client is not None:
+                client.closed = True
+                client.wakeup.set()
+                self.clients.discard(client)
+            if pump is not None:
+                pump.cancel()
+            writer.close()
+
+    def _dispatch(self, client, text):
+        if self.on_message is None:
+            return
+        try:
+            reply = self.on_message(json.loads(text))
+        except ValueError:
+            return
+        if reply is not None:
+            self._send_json(client, reply)